@@ -1,16 +1,15 @@
+import time
+_PROCESS_START = time.perf_counter() # for --profile-startup
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog, font as tkfont
-import json, csv, time, math, os
+from tkinter import ttk, font as tkfont # messagebox/filedialog are imported where they are used
+import math, sys, threading, bisect, contextlib, collections
 
-# optional audio libs (only winsound)
-try:
-    import winsound
-    HAVE_WINSOUND = True
-except Exception:
-    HAVE_WINSOUND = False
-
-APP_STATE_FILE = "productivity_timer_state.json"
+from focus_engine import TimerEngine, SessionStats, SessionStore, AchievementTracker, now_iso, catch_up
+from focus_storage import open_storage, load_achievements, StateWriter, ExportJob
+from focus_telemetry import Telemetry
+from focus_audio import AudioPlayer
+from focus_history import HistoryIndex, HISTORY_COLUMNS, day_bounds, session_snapshot
 
 # Localization (en, ko, cn)
 LOCALES = {
@@ -27,7 +26,21 @@ LOCALES = {
         "focus_label_note": "Step 5", "break_label_note": "Step 1",
         "theme_soft": "Soft (default)", "theme_playful": "Playful",
         "badge_message": "You got {name} badge now. Congratulations!",
-        "reset_data": "Reset Data", "reset_data_confirm": "Clear all saved settings and session history?"
+        "level_up": "Level {level} reached!", "focus_done": "Focus session done (+{xp} XP). Time for a break.",
+        "break_done": "Break's over. Back to focus!", "more_notices": "...and {count} more",
+        "reset_data": "Reset Data", "reset_data_confirm": "Clear all saved settings and session history?",
+        "export_from": "From (YYYY-MM-DD)", "export_to": "To (YYYY-MM-DD)", "export_focus": "Focus sessions",
+        "export_break": "Break sessions", "export_gzip": "Compress (gzip)", "exporting": "Exporting...",
+        "cancel": "Cancel", "export_cancelled": "Export cancelled.", "bad_date": "Dates must look like 2024-01-31.",
+        "stats": "Stats", "today": "Today", "this_week": "This week", "this_month": "This month", "minutes": "min",
+        "completed": "Completed", "aborted": "Stopped early", "completion_rate": "Completion rate",
+        "longest_streak": "Longest streak (sessions)", "longest_day_streak": "Longest streak (days)", "last_7_days": "Last 7 days",
+        "import": "Import History", "importing": "Importing...", "import_cancelled": "Import cancelled.",
+        "import_done": "History merged: {sessions} sessions ({duplicates} duplicates and {skipped} unreadable rows skipped).",
+        "import_failed": "These files could not be read:",
+        "history": "History", "history_all": "All", "history_time": "Time", "history_type": "Type",
+        "history_minutes": "Minutes", "history_result": "Result", "history_apply": "Apply",
+        "history_count": "{shown:,} of {total:,} sessions", "history_loading": "Loading..."
     },
     "ko": {
         "title": "집중+ 타이머",
@@ -42,7 +55,21 @@ LOCALES = {
         "focus_label_note": "증분 5", "break_label_note": "증분 1",
         "theme_soft": "부드러운 (기본)", "theme_playful": "게임형",
         "badge_message": "{name} 배지를 획득했습니다. 축하합니다!",
-        "reset_data": "데이터 초기화", "reset_data_confirm": "모든 설정과 기록을 삭제하시겠습니까?"
+        "level_up": "레벨 {level} 달성!", "focus_done": "집중 세션 완료 (+{xp} XP). 휴식 시간입니다.",
+        "break_done": "휴식이 끝났습니다. 다시 집중하세요!", "more_notices": "...외 {count}개",
+        "reset_data": "데이터 초기화", "reset_data_confirm": "모든 설정과 기록을 삭제하시겠습니까?",
+        "export_from": "시작일 (YYYY-MM-DD)", "export_to": "종료일 (YYYY-MM-DD)", "export_focus": "집중 세션",
+        "export_break": "휴식 세션", "export_gzip": "압축 (gzip)", "exporting": "내보내는 중...",
+        "cancel": "취소", "export_cancelled": "내보내기가 취소되었습니다.", "bad_date": "날짜는 2024-01-31 형식이어야 합니다.",
+        "stats": "통계", "today": "오늘", "this_week": "이번 주", "this_month": "이번 달", "minutes": "분",
+        "completed": "완료", "aborted": "중단", "completion_rate": "완료율",
+        "longest_streak": "최장 연속 (세션)", "longest_day_streak": "최장 연속 (일)", "last_7_days": "최근 7일",
+        "import": "기록 가져오기", "importing": "가져오는 중...", "import_cancelled": "가져오기가 취소되었습니다.",
+        "import_done": "기록을 병합했습니다: {sessions}개 세션 (중복 {duplicates}개, 읽을 수 없는 행 {skipped}개 제외).",
+        "import_failed": "다음 파일을 읽을 수 없습니다:",
+        "history": "기록", "history_all": "전체", "history_time": "시간", "history_type": "종류",
+        "history_minutes": "분", "history_result": "결과", "history_apply": "적용",
+        "history_count": "{total:,}개 중 {shown:,}개 세션", "history_loading": "불러오는 중..."
     },
     "cn": {
         "title": "专注+ 计时器",
@@ -57,7 +84,21 @@ LOCALES = {
         "focus_label_note": "步长 5", "break_label_note": "步长 1",
         "theme_soft": "柔和 (默认)", "theme_playful": "活泼",
         "badge_message": "你获得了{name}徽章。恭喜！",
-        "reset_data": "重置数据", "reset_data_confirm": "是否清除所有保存的设置和会话记录？"
+        "level_up": "达到等级 {level}！", "focus_done": "专注会话完成（+{xp} XP）。休息一下吧。",
+        "break_done": "休息结束，继续专注！", "more_notices": "……还有 {count} 条",
+        "reset_data": "重置数据", "reset_data_confirm": "是否清除所有保存的设置和会话记录？",
+        "export_from": "开始日期 (YYYY-MM-DD)", "export_to": "结束日期 (YYYY-MM-DD)", "export_focus": "专注会话",
+        "export_break": "休息会话", "export_gzip": "压缩 (gzip)", "exporting": "正在导出...",
+        "cancel": "取消", "export_cancelled": "导出已取消。", "bad_date": "日期格式应为 2024-01-31。",
+        "stats": "统计", "today": "今天", "this_week": "本周", "this_month": "本月", "minutes": "分钟",
+        "completed": "已完成", "aborted": "提前结束", "completion_rate": "完成率",
+        "longest_streak": "最长连胜 (会话)", "longest_day_streak": "最长连胜 (天)", "last_7_days": "最近 7 天",
+        "import": "导入记录", "importing": "正在导入...", "import_cancelled": "导入已取消。",
+        "import_done": "记录已合并：{sessions} 个会话（跳过 {duplicates} 个重复项和 {skipped} 个无法读取的行）。",
+        "import_failed": "以下文件无法读取：",
+        "history": "历史", "history_all": "全部", "history_time": "时间", "history_type": "类型",
+        "history_minutes": "分钟", "history_result": "结果", "history_apply": "应用",
+        "history_count": "{shown:,} / {total:,} 个会话", "history_loading": "正在加载..."
     }
 }
 
@@ -67,67 +108,455 @@ THEMES = {
     "Playful": {"bg": "#FFF6EE", "fg": "#071122", "accent": "#FF6B00", "accent2": "#FF3B30", "accent3": "#00B3FF", "accent4": "#32D74B", "progress_bg": "#FFF6F6"}
 }
 
-# Helpers for persistence
-def load_state():
-    if os.path.exists(APP_STATE_FILE):
-        try:
-            with open(APP_STATE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
-
-def save_state(state):
-    try:
-        with open(APP_STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
-
-def now_iso():
-    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-
 # Dyslexia font helpers
+DYSLEXIA_FONT_CANDIDATES = ("OpenDyslexic3", "OpenDyslexic", "Comic Sans MS", "DejaVu Sans", "Verdana", "Arial")
+NORMAL_FONT_CANDIDATES = ("Helvetica", "Segoe UI", "Arial", "DejaVu Sans", "Verdana")
+
+class FontResolver:
+    # Asking Tk for the installed families is slow on machines with lots of fonts,
+    # so they are enumerated once (on first use) into a sorted lowercase index and
+    # every answer is memoized. Call refresh() after fonts were installed/removed.
+    def __init__(self, families=None):
+        self._families = families # callable returning the family names, default tkfont.families
+        self._index = None # sorted (lowercase name, enumeration order, name)
+        self._keys = None
+        self._resolved = {}
+
+    def refresh(self):
+        self._index = None
+        self._keys = None
+        self._resolved.clear()
+
+    def _build_index(self):
+        names = (self._families or tkfont.families)()
+        self._index = sorted((fam.lower(), pos, fam) for pos, fam in enumerate(names))
+        self._keys = [entry[0] for entry in self._index]
+
+    def find_prefix(self, prefix):
+        # the family Tk lists first among those starting with prefix (case-insensitive)
+        if self._index is None:
+            self._build_index()
+        prefix = prefix.lower()
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + "\uffff", lo)
+        if lo == hi:
+            return None
+        return min(self._index[lo:hi], key=lambda entry: entry[1])[2]
+
+    def resolve(self, candidates):
+        # first candidate that matches an installed family
+        candidates = tuple(candidates)
+        if candidates not in self._resolved:
+            found = None
+            for c in candidates:
+                found = self.find_prefix(c)
+                if found:
+                    break
+            self._resolved[candidates] = found
+        return self._resolved[candidates]
+
+FONTS = FontResolver()
+
 def detect_preferred_dyslexia_font():
-    candidates = ["OpenDyslexic3", "OpenDyslexic", "Comic Sans MS", "DejaVu Sans", "Verdana", "Arial"]
-    available = list(tkfont.families())
-    for c in candidates:
-        for fam in available:
-            if fam.lower().startswith(c.lower()):
-                return fam
-    return None
+    return FONTS.resolve(DYSLEXIA_FONT_CANDIDATES)
 
 def get_normal_font_family():
-    candidates = ["Helvetica", "Segoe UI", "Arial", "DejaVu Sans", "Verdana"]
-    available = list(tkfont.families())
-    for c in candidates:
-        for fam in available:
-            if fam.lower().startswith(c.lower()):
-                return fam
-    return "Helvetica"
+    return FONTS.resolve(NORMAL_FONT_CANDIDATES) or "Helvetica"
+
+TOAST_MS = 4000
+TOAST_MAX_LINES = 4
+
+class ToastQueue:
+    # Non-modal notifications drawn on top of the main window. Everything posted
+    # during one pass of the event loop (a finished session can bring a level-up and
+    # several badges at once) is shown as a single toast; toasts posted while one is
+    # up wait their turn. A toast goes away by itself after TOAST_MS, or on a click.
+    # While the window is hidden (suspend()) toasts only pile up, and the one that
+    # was showing starts over on resume().
+    def __init__(self, root, duration_ms=TOAST_MS):
+        self.root = root
+        self.duration_ms = duration_ms
+        self.pending = []
+        self.queue = collections.deque()
+        self.label = None
+        self.look = {}
+        self.more_text = "+{count}"
+        self.suspended = False
+        self._flush_job = None
+        self._hide_job = None
+
+    def notify(self, text, first=False):
+        if first:
+            self.pending.insert(0, text)
+        else:
+            self.pending.append(text)
+        if self._flush_job is None:
+            self._flush_job = self.root.after_idle(self._flush)
+
+    def restyle(self, **look):
+        # bg/fg/font, kept for toasts that aren't created yet
+        self.look.update(look)
+        if self.label is not None:
+            self.label.configure(**self.look)
+
+    def _flush(self):
+        self._flush_job = None
+        lines, self.pending = self.pending, []
+        if len(lines) > TOAST_MAX_LINES:
+            extra = len(lines) - TOAST_MAX_LINES + 1
+            lines = lines[:TOAST_MAX_LINES - 1] + [self.more_text.format(count=extra)]
+        self.queue.append("\n".join(lines))
+        if self._hide_job is None and not self.suspended:
+            self._show_next()
+
+    def _show_next(self):
+        if not self.queue:
+            if self.label is not None:
+                self.label.place_forget()
+            return
+        if self.label is None:
+            self.label = tk.Label(self.root, padx=16, pady=10, justify="center", cursor="hand2", **self.look)
+            self.label.bind("<Button-1>", self.dismiss)
+        self.label.configure(text=self.queue.popleft())
+        self.label.place(relx=0.5, y=12, anchor="n")
+        self.label.lift()
+        self._hide_job = self.root.after(self.duration_ms, self.dismiss)
+
+    def suspend(self):
+        self.suspended = True
+        if self._hide_job is not None:
+            self.root.after_cancel(self._hide_job)
+            self._hide_job = None
+            self.queue.appendleft(self.label.cget("text"))
+
+    def resume(self):
+        self.suspended = False
+        if self._hide_job is None and self.queue:
+            self._show_next()
+
+    def dismiss(self, event=None):
+        if self._hide_job is not None:
+            self.root.after_cancel(self._hide_job)
+            self._hide_job = None
+        self._show_next()
+
+# longest wait between ticks while the window is hidden (see hidden_wakeup_ms())
+HIDDEN_WAKEUP_MAX_MS = 60000
+
+HISTORY_ROWS = 20 # Treeview items in the history window, reused while scrolling
+HISTORY_WIDTHS = {"time": 150, "type": 80, "minutes": 70, "xp": 60, "success": 110}
+
+class HistoryWindow:
+    # The session history in a ttk.Treeview that only ever holds HISTORY_ROWS items.
+    # The scrollbar is driven by hand: scrolling moves `top`, and the next idle pass
+    # rewrites those items' values from the current view, an array of positions from
+    # focus_history.HistoryIndex. A million sessions cost the same as twenty.
+    # Loading the snapshot and every sort/filter run on a worker thread, which the
+    # window polls for, like the export and import progress.
+    HEADINGS = {"time": "history_time", "type": "history_type", "minutes": "history_minutes",
+                "xp": "xp", "success": "history_result"}
+
+    def __init__(self, root, strings, session_log):
+        self.root = root
+        self.strings = s = strings
+        self.index = None
+        self.rows = ()
+        self.top = 0
+        self.sort, self.descending = "time", True # newest first
+        self._generation = 0 # bumped by every query; results of older ones are dropped
+        self._render_job = None
+        self._shown = [None] * HISTORY_ROWS # position each item currently shows
+
+        self.win = win = tk.Toplevel(root)
+        win.title(s["history"]); win.transient(root)
+        win.resizable(True, False)
+        win.columnconfigure(0, weight=1)
+        bar = ttk.Frame(win, padding=(8, 8, 8, 0))
+        bar.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.type_names = {s["history_all"]: None, s["export_focus"]: ["focus"], s["export_break"]: ["break"]}
+        self.result_names = {s["history_all"]: None, s["completed"]: True, s["aborted"]: False}
+        self.type_var = tk.StringVar(value=s["history_all"])
+        self.result_var = tk.StringVar(value=s["history_all"])
+        self.start_var, self.end_var = tk.StringVar(), tk.StringVar()
+        ttk.Combobox(bar, textvariable=self.type_var, values=list(self.type_names), state="readonly", width=14).grid(row=0, column=0, padx=(0, 6))
+        ttk.Combobox(bar, textvariable=self.result_var, values=list(self.result_names), state="readonly", width=14).grid(row=0, column=1, padx=6)
+        ttk.Label(bar, text=s["export_from"]).grid(row=0, column=2, padx=(6, 2))
+        ttk.Entry(bar, textvariable=self.start_var, width=11).grid(row=0, column=3)
+        ttk.Label(bar, text=s["export_to"]).grid(row=0, column=4, padx=(6, 2))
+        ttk.Entry(bar, textvariable=self.end_var, width=11).grid(row=0, column=5)
+        ttk.Button(bar, text=s["history_apply"], command=self.run_query).grid(row=0, column=6, padx=6)
+        for widget in bar.winfo_children():
+            if isinstance(widget, ttk.Combobox):
+                widget.bind("<<ComboboxSelected>>", lambda e: self.run_query())
+            elif isinstance(widget, ttk.Entry):
+                widget.bind("<Return>", lambda e: self.run_query())
+
+        self.tree = tree = ttk.Treeview(win, columns=HISTORY_COLUMNS, show="headings", height=HISTORY_ROWS, selectmode="browse")
+        for c in HISTORY_COLUMNS:
+            tree.heading(c, command=lambda c=c: self.sort_by(c))
+            tree.column(c, width=HISTORY_WIDTHS[c], anchor="w" if c in ("time", "type") else "e")
+        tree.grid(row=1, column=0, sticky="nsew", padx=(8, 0), pady=8)
+        self.scrollbar = ttk.Scrollbar(win, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns", padx=(0, 8), pady=8)
+        self.items = [tree.insert("", "end") for _ in range(HISTORY_ROWS)]
+        tree.detach(*self.items)
+        self.status = ttk.Label(win, text=s["history_loading"])
+        self.status.grid(row=2, column=0, columnspan=2, sticky="w", padx=8, pady=(0, 8))
+        self.show_headings()
+
+        for seq, delta in (("<Button-4>", -3), ("<Button-5>", 3), ("<Up>", -1), ("<Down>", 1),
+                           ("<Prior>", -HISTORY_ROWS), ("<Next>", HISTORY_ROWS)):
+            tree.bind(seq, lambda e, d=delta: self.scroll_by(d))
+        tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        tree.bind("<Home>", lambda e: self.scroll_to(0))
+        tree.bind("<End>", lambda e: self.scroll_to(len(self.rows)))
+        tree.focus_set()
+        self._start(lambda: self._load(session_log))
+
+    def alive(self):
+        try:
+            return bool(self.win.winfo_exists())
+        except tk.TclError:
+            return False
+
+    # Worker thread
+    def _load(self, session_log):
+        self.index = HistoryIndex(session_snapshot(session_log))
+        return self.index.query(self.sort, self.descending)
+
+    def _start(self, work):
+        # run work() on a thread; its result becomes the view unless a newer query started
+        self._generation += 1
+        generation, result = self._generation, {}
+        def run():
+            try:
+                result["rows"] = work()
+            except Exception as e:
+                result["error"] = e
+        thread = threading.Thread(target=run, name="history-query", daemon=True)
+        thread.start()
+        def poll():
+            if not self.alive() or generation != self._generation:
+                return
+            if thread.is_alive():
+                self.root.after(20, poll)
+                return
+            if "error" in result:
+                self.status.config(text=f"{self.strings['save_error']}: {result['error']}")
+                return
+            self.rows = result["rows"]
+            self.top = 0
+            self.show_headings()
+            self.render()
+        poll()
+
+    # Sorting / filtering
+    def run_query(self):
+        if self.index is None:
+            return
+        start, end = self.start_var.get().strip() or None, self.end_var.get().strip() or None
+        try:
+            day_bounds(start, end)
+        except ValueError:
+            self.status.config(text=self.strings["bad_date"])
+            return
+        query = dict(sort=self.sort, descending=self.descending, types=self.type_names.get(self.type_var.get()),
+                     success=self.result_names.get(self.result_var.get()), start_date=start, end_date=end)
+        self.status.config(text=self.strings["history_loading"])
+        self._start(lambda: self.index.query(**query))
+
+    def sort_by(self, column):
+        if column == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort, self.descending = column, column == "time"
+        self.show_headings()
+        self.run_query()
+
+    def show_headings(self):
+        for c in HISTORY_COLUMNS:
+            arrow = (" ▼" if self.descending else " ▲") if c == self.sort else ""
+            self.tree.heading(c, text=self.strings[self.HEADINGS[c]] + arrow)
+
+    # Scrolling
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            self.scroll_by(int(args[1]) * (HISTORY_ROWS if args[2] == "pages" else 1))
+
+    def scroll_by(self, delta):
+        self.scroll_to(self.top + delta)
+        return "break" # the Treeview's own bindings would move the selection instead
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.rows) - HISTORY_ROWS))
+        if top != self.top:
+            self.top = top
+            if self._render_job is None: # a fast drag renders once per idle pass
+                self._render_job = self.root.after_idle(self.render)
+        return "break"
+
+    def render(self):
+        self._render_job = None
+        if not self.alive():
+            return
+        s, n = self.strings, len(self.rows)
+        for k, iid in enumerate(self.items):
+            pos = self.top + k
+            if pos >= n:
+                if self._shown[k] is not None:
+                    self.tree.detach(iid)
+                    self._shown[k] = None
+                continue
+            i = int(self.rows[pos])
+            if self._shown[k] != i:
+                when, typ, minutes, xp, success = self.index.row(i)
+                self.tree.item(iid, values=(when, typ, minutes, xp, s["completed"] if success else s["aborted"]))
+                if self._shown[k] is None:
+                    self.tree.move(iid, "", k)
+                self._shown[k] = i
+        if n:
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + HISTORY_ROWS) / n))
+        else:
+            self.scrollbar.set(0, 1)
+        self.status.config(text=s["history_count"].format(shown=n, total=self.index.size))
+
+class ViewState:
+    # Small observable store for what the window shows. Each binding names the fields
+    # it depends on and is re-rendered only when one of them changes value.
+    def __init__(self):
+        self.values = {}
+        self.bindings = {} # field -> [render, ...]
+
+    def bind(self, fields, render):
+        for name in fields:
+            self.bindings.setdefault(name, []).append(render)
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def update(self, **changes):
+        # returns the names of the fields that actually changed
+        changed = [k for k, v in changes.items() if k not in self.values or self.values[k] != v]
+        self.values.update((k, changes[k]) for k in changed)
+        seen = set()
+        for name in changed:
+            for render in self.bindings.get(name, ()):
+                if id(render) not in seen:
+                    seen.add(id(render))
+                    render()
+        return changed
+
+class TkCallCounter:
+    # --count-tk-calls: counts configure/itemconfig/coords/style calls made while
+    # handling each UI event. Disabled, measure() is a no-op.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.calls = 0
+        self.events = {} # event -> [times handled, tk calls]
+
+    def wrap(self, obj, *methods):
+        # count calls to obj.<method> by shadowing them on the instance
+        if not self.enabled:
+            return
+        for name in methods:
+            original = getattr(obj, name)
+            def counted(*args, _original=original, **kw):
+                self.calls += 1
+                return _original(*args, **kw)
+            setattr(obj, name, counted)
+
+    def instrument(self, root, canvas, style):
+        self.wrap(canvas, "itemconfig", "itemconfigure", "coords", "configure", "config")
+        self.wrap(style, "configure")
+        self.wrap(root, "configure", "config", "title")
+        todo = list(root.winfo_children())
+        while todo:
+            w = todo.pop()
+            todo.extend(w.winfo_children())
+            if w is not canvas:
+                self.wrap(w, "configure", "config")
+
+    @contextlib.contextmanager
+    def measure(self, event):
+        if not self.enabled:
+            yield
+            return
+        before = self.calls
+        try:
+            yield
+        finally:
+            record = self.events.setdefault(event, [0, 0])
+            record[0] += 1
+            record[1] += self.calls - before
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("tk calls per event:", file=sys.stderr)
+        for event, (times, calls) in sorted(self.events.items()):
+            print(f"  {event:18s} {times:6d} x  {calls / times:6.1f} calls", file=sys.stderr)
+
+def _engine_field(name):
+    # the timer/progress state lives in the engine; the app just exposes it
+    return property(lambda self: getattr(self.engine, name), lambda self, value: setattr(self.engine, name, value))
 
 class ProductivityTimerApp:
-    def __init__(self, root):
+    xp = _engine_field("xp")
+    level = _engine_field("level")
+    streak = _engine_field("streak")
+    badges = _engine_field("badges")
+    achievements = _engine_field("achievements")
+    session_log = _engine_field("session_log")
+    is_focus = _engine_field("is_focus")
+    is_running = _engine_field("is_running")
+    remaining = _engine_field("remaining")
+
+    def __init__(self, root, storage=None, profiler=None, tk_counter=None, telemetry=None):
         self.root = root
-        self.state = load_state()
+        self.profiler = profiler or StartupProfiler(enabled=False)
+        self.tk_counter = tk_counter or TkCallCounter()
+        self.telemetry = telemetry or Telemetry()
+        self.view = ViewState()
+        self.font_family = "Helvetica"
+        self.storage = storage or open_storage()
+        self.telemetry.time_saves(self.storage) # before the state writer picks up save_state
+        # only the small settings/progress part here; the history follows once the window is up
+        self.state = self.storage.load_settings()
+        self.profiler.mark("load settings")
         self.locale = self.state.get("locale", "en")
         self.strings = LOCALES.get(self.locale, LOCALES["en"])
 
-        # progress / badges
-        self.xp = self.state.get("xp", 0)
-        self.level = self.state.get("level", 1)
-        self.streak = self.state.get("streak", 0)
-        self.badge_thresholds = {3: "Bronze", 5: "Silver", 10: "Gold"}
-        self.badges = set(self.state.get("badges", []))
-        self.session_log = self.state.get("session_log", [])
-
         # timer settings
         self.focus_min = tk.IntVar(value=self.state.get("focus_min", 25))
         self.break_min = tk.IntVar(value=self.state.get("break_min", 5))
-        self.is_focus = True
-        self.remaining = self.focus_min.get() * 60
-        self.is_running = False
+
+        # timer, progress and badges
+        self.engine = TimerEngine(self.focus_min.get(), self.break_min.get(),
+                                  xp=self.state.get("xp", 0), level=self.state.get("level", 1),
+                                  streak=self.state.get("streak", 0), badges=self.state.get("badges", []),
+                                  achievements=load_achievements(),
+                                  achievement_state=self.state.get("achievements"),
+                                  session_log=SessionStore(), # sessions of this run until the history is loaded
+                                  stats=SessionStats(self.state.get("stats")))
+        self.engine.add_listener(self.on_engine_event)
+        # what the stats/achievements were saved as; the history loader catches them up
+        self._saved_progress = (self.state.get("stats"), self.state.get("achievements"))
+        self.history_loaded = False
+        self._history_thread = None
+        self.writer = StateWriter(self.storage.save_state)
+        self._tick_job = None
+        # rendering is suspended while the window is minimized or fully covered
+        self.unmapped = False
+        self.obscured = False
+        self.hidden = False
+        self._stale = False # something changed while hidden
+        self.export_job = None
+        self.import_job = None
+        self.audio = AudioPlayer()
+        self.toasts = ToastQueue(root)
+        self.history_window = None
 
         # prefs
         self.muted = tk.BooleanVar(value=self.state.get("muted", False))
@@ -137,17 +566,126 @@ class ProductivityTimerApp:
 
         # build UI
         self.build_ui()
-        self.apply_font_family()
-        self.apply_theme()
-        self.update_all_texts()
-        self.update_timer_display()
+        # before bind_view(), which holds on to apply_theme
+        self.telemetry.time_calls(self, "draw_progress", "update_timer_display", "refresh_view", "apply_theme")
+        self.telemetry.time_ticks(self)
+        if self.telemetry.enabled:
+            self.root.bind("<Control-Shift-D>", lambda e: self.open_debug_panel())
+        self.bind_view()
+        self.tk_counter.instrument(self.root, self.canvas, self.style)
+        self.profiler.mark("build ui")
+        # first paint with the default family; the installed fonts are looked at later
+        self.apply_font_family(resolve=False)
+        self.export_btn.state(["disabled"]) # until the history is loaded
+        self.history_btn.state(["disabled"])
+        self.profiler.mark("initial render")
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<Map>", self.on_first_map, add="+")
+        self.root.bind("<Map>", self.on_map_change, add="+")
+        self.root.bind("<Unmap>", self.on_map_change, add="+")
+        self.canvas.bind("<Visibility>", self.on_visibility)
+
+    # Deferred startup work
+    def on_first_map(self, event):
+        if event.widget is not self.root or self._history_thread is not None:
+            return
+        self.profiler.mark("window mapped")
+        self.root.after(10, self.load_deferred)
+
+    # Hidden window: no drawing, one wakeup per session end
+    def on_map_change(self, event):
+        if event.widget is self.root: # the root's bindings also see every child widget
+            self.unmapped = event.type == tk.EventType.Unmap
+            self.set_hidden(self.unmapped or self.obscured)
+
+    def on_visibility(self, event):
+        self.obscured = event.state == "VisibilityFullyObscured"
+        self.set_hidden(self.unmapped or self.obscured)
+
+    def set_hidden(self, hidden):
+        if hidden == self.hidden:
+            return
+        self.hidden = hidden
+        if hidden:
+            self.toasts.suspend()
+            if self.is_running: # the pending tick is a second away; make it the deadline
+                self.schedule_tick(self.hidden_wakeup_ms())
+            return
+        # back on screen: catch up in one redraw, then tick every second again
+        with self.tk_counter.measure("restore"):
+            if self._stale:
+                self._stale = False
+                self.refresh_view()
+            if self.is_running:
+                if self._tick_job is not None:
+                    self.root.after_cancel(self._tick_job)
+                    self._tick_job = None
+                self.countdown_tick()
+            else:
+                self.update_timer_display()
+        self.toasts.resume()
+
+    def hidden_wakeup_ms(self):
+        # the session deadline, but at least every HIDDEN_WAKEUP_MAX_MS: Tk's timers
+        # stand still while the machine sleeps, so one long wait could end a session late
+        return min(int(self.engine.clock.seconds_left() * 1000) + 1, HIDDEN_WAKEUP_MAX_MS)
+
+    def load_deferred(self):
+        # history on a worker thread, fonts on the Tk thread (Tk isn't thread-safe); the
+        # worker also catches the saved stats and achievements up with the history
+        result = {}
+        def work():
+            t0 = time.perf_counter()
+            log = self.storage.load_history()
+            result["progress"] = catch_up(log, self.achievements, *self._saved_progress)
+            result["log"] = log
+            result["seconds"] = time.perf_counter() - t0
+        self._history_result = result
+        self._history_thread = threading.Thread(target=work, name="history-loader", daemon=True)
+        self._history_thread.start()
+        self.profiler.reset_clock()
+        self.apply_font_family()
+        self.profiler.mark("fonts")
+        self.root.after(20, self.poll_history)
+
+    def poll_history(self):
+        if self.history_loaded:
+            return
+        if self._history_thread.is_alive():
+            self.root.after(20, self.poll_history)
+            return
+        self.finish_history_load()
+
+    def finish_history_load(self):
+        # merge the loaded history with whatever was logged in the meantime
+        if self.history_loaded:
+            return
+        if self._history_thread is None:
+            self.load_deferred() # closed/reset before the window was even mapped
+        self._history_thread.join()
+        log = self._history_result.get("log")
+        if log is None: # the loader failed; do it here
+            log = self.storage.load_history()
+            self._history_result["progress"] = catch_up(log, self.achievements, *self._saved_progress)
+        # only the sessions logged since startup are counted here; the saved stats and
+        # achievements were caught up with the history (lagging after a crash between
+        # saves, or checked against other rules) on the loader thread
+        new_badges = self.engine.adopt_history(log, *self._history_result["progress"])
+        self.history_loaded = True
+        for aid in new_badges:
+            self.toasts.notify(self.strings.get("badge_message", "You got {name} badge now. Congratulations!").format(name=self.achievements.rules[aid]["name"]))
+        self.refresh_view()
+        self.export_btn.state(["!disabled"])
+        self.history_btn.state(["!disabled"])
+        self.profiler.add("history (background)", self._history_result.get("seconds", 0.0))
+        self.profiler.mark("history merged")
+        self.profiler.report(len(log))
 
     def build_ui(self):
         self.root.title(self.strings["title"])
         self.root.geometry("800x520") # Changed width from 760 to 800
-        style = ttk.Style(self.root);
-        style.theme_use("clam")
+        self.style = ttk.Style(self.root);
+        self.style.theme_use("clam")
 
         main = ttk.Frame(self.root, padding=12)
         main.grid(row=0, column=0, sticky="nsew")
@@ -158,6 +696,7 @@ class ProductivityTimerApp:
         # We use a canvas so we can draw the circular progress bar
         self.canvas = tk.Canvas(main, width=380, height=380, highlightthickness=0)
         self.canvas.grid(row=0, column=0, rowspan=4, padx=12, pady=12)
+        self.create_progress_ring()
         # Center the text in the canvas (380/2 = 190, but 200 looked better)
         self.timer_text = self.canvas.create_text(200, 160, text="", font=("Helvetica", 36, "bold"))
         self.session_label = self.canvas.create_text(200, 220, text="", font=("Helvetica", 12))
@@ -214,23 +753,26 @@ class ProductivityTimerApp:
         badge_frame = ttk.Frame(right);
         badge_frame.grid(row=6, column=0, columnspan=3, pady=(6,0))
         self.badge_labels = {}
-        col = 0
-        for threshold, name in sorted(self.badge_thresholds.items()):
-            lbl = ttk.Label(badge_frame, text=f"{name} ({threshold})", width=10, anchor="center", relief="ridge")
-            lbl.grid(row=0, column=col, padx=4, pady=2)
-            self.badge_labels[threshold] = lbl
-            col += 1
+        for i, aid in enumerate(self.achievements.showcase()): # three to a row
+            rule = self.achievements.rules[aid]
+            lbl = ttk.Label(badge_frame, text=f"{rule['name']} ({rule['threshold']})", width=-10, anchor="center", relief="ridge")
+            lbl.grid(row=i // 3, column=i % 3, padx=4, pady=2, sticky="ew")
+            self.badge_labels[aid] = lbl
 
         # bottom: settings, export, language
         bottom = ttk.Frame(self.root, padding=8);
-        bottom.grid(row=1, column=0, sticky="ew"); bottom.columnconfigure(2, weight=1)
+        bottom.grid(row=1, column=0, sticky="ew"); bottom.columnconfigure(4, weight=1)
         self.settings_btn = ttk.Button(bottom, text="", command=self.open_settings);
         self.settings_btn.grid(row=0, column=0, padx=6)
         self.export_btn = ttk.Button(bottom, text="", command=self.export_csv);
         self.export_btn.grid(row=0, column=1, padx=6)
+        self.stats_btn = ttk.Button(bottom, text="", command=self.open_stats);
+        self.stats_btn.grid(row=0, column=2, padx=6)
+        self.history_btn = ttk.Button(bottom, text="", command=self.open_history);
+        self.history_btn.grid(row=0, column=3, padx=6, sticky="w")
         self.lang_var = tk.StringVar(value=self.locale)
         self.lang_menu = ttk.OptionMenu(bottom, self.lang_var, self.locale, "en", "ko", "cn", command=self.change_language);
-        self.lang_menu.grid(row=0, column=2, sticky="e")
+        self.lang_menu.grid(row=0, column=4, sticky="e")
 
         # shortcuts
         self.root.bind("<space>", lambda e: self.toggle_start_pause())
@@ -238,17 +780,60 @@ class ProductivityTimerApp:
         self.root.bind("q", lambda e: self.set_quick(25,5))
 
     # Fonts / Dyslexia mode
-    def apply_font_family(self):
-        if self.dyslexia_font.get():
-            fam = detect_preferred_dyslexia_font() or get_normal_font_family()
+    def apply_font_family(self, resolve=True):
+        if not resolve:
+            self.font_family = "Helvetica"
+        elif self.dyslexia_font.get():
+            self.font_family = detect_preferred_dyslexia_font() or get_normal_font_family()
         else:
-            fam = get_normal_font_family()
-        style = ttk.Style()
-        style.configure("TButton", font=(fam, max(10, self.font_size.get())))
-        style.configure("TLabel", font=(fam, max(10, self.font_size.get())))
-        self.canvas.itemconfig(self.timer_text, font=(fam, self.font_size.get()+18, "bold"))
-        self.canvas.itemconfig(self.session_label, font=(fam, max(10, self.font_size.get()-2)))
-        self.update_all_texts()
+            self.font_family = get_normal_font_family()
+        self.refresh_view()
+
+    # View: every widget below re-renders only when a field it shows changes
+    def refresh_view(self):
+        self.view.update(locale=self.locale, running=self.is_running, xp=self.xp, level=self.level,
+                         streak=self.streak, badges=frozenset(self.badges), theme=self.theme_name.get(),
+                         font=(self.font_family, self.font_size.get()))
+
+    def bind_view(self):
+        s = lambda key: self.strings[key]
+        texts = [(self.reset_btn, "reset"), (self.q25_btn, "quick_25_5"), (self.q50_btn, "quick_50_10"),
+                 (self.focus_label, "focus_min"), (self.break_label, "break_min"),
+                 (self.focus_note, "focus_label_note"), (self.break_note, "break_label_note"),
+                 (self.settings_btn, "settings"), (self.export_btn, "export"), (self.stats_btn, "stats"),
+                 (self.history_btn, "history")]
+        def render_texts():
+            self.root.title(s("title"))
+            self.toasts.more_text = s("more_notices")
+            for widget, key in texts:
+                widget.config(text=s(key))
+            self.update_timer_display() # session label
+        self.view.bind(["locale"], render_texts)
+        self.view.bind(["locale", "running"], lambda: self.start_btn.config(text=s("pause") if self.is_running else s("start")))
+        self.view.bind(["locale", "xp"], lambda: self.xp_label.config(text=f"{s('xp')}: {self.xp}"))
+        self.view.bind(["locale", "level"], lambda: self.level_label.config(text=f"{s('level')}: {self.level}"))
+        self.view.bind(["locale", "streak"], lambda: self.streak_label.config(text=f"{s('streak')}: {self.streak}"))
+        self.view.bind(["theme"], self.apply_theme)
+        self.view.bind(["font"], self.apply_font)
+        for aid in self.badge_labels:
+            self.view.bind(["theme", "badges"], lambda a=aid: self.color_badge(a))
+
+    def apply_font(self):
+        fam, size = self.view.get("font")
+        self.style.configure("TButton", font=(fam, max(10, size)))
+        self.style.configure("TLabel", font=(fam, max(10, size)))
+        self.canvas.itemconfig(self.timer_text, font=(fam, size+18, "bold"))
+        self.canvas.itemconfig(self.session_label, font=(fam, max(10, size-2)))
+        self.toasts.restyle(font=(fam, max(10, size)))
+
+    def color_badge(self, aid):
+        theme = THEMES.get(self.theme_name.get(), THEMES["Soft"])
+        bg = theme.get("accent2") if aid in self.badges else theme.get("bg", "#fff")
+        colors = (bg, theme.get("fg"))
+        lbl = self.badge_labels[aid]
+        if getattr(lbl, "_colors", None) != colors: # badges changed, but maybe not this one
+            lbl._colors = colors
+            lbl.configure(background=colors[0], foreground=colors[1])
 
     # Theme
     def apply_theme(self):
@@ -256,51 +841,41 @@ class ProductivityTimerApp:
         bg = theme.get("bg", "#fff");
         fg = theme.get("fg", "#000")
         self.root.configure(bg=bg)
-        for w in self.root.winfo_children():
-            try:
-                w.configure(background=bg)
-            except Exception:
-                pass
         self.canvas.configure(bg=theme.get("progress_bg", "#fff"))
         self.canvas.itemconfig(self.timer_text, fill=fg)
         self.canvas.itemconfig(self.session_label, fill=fg)
-        style = ttk.Style()
-        style.configure("TButton", font=("Helvetica", max(10, self.font_size.get())))
+        self.color_progress_ring(theme)
+        self.toasts.restyle(bg=theme.get("accent2", "#6EC6A5"), fg=fg)
         if self.theme_name.get() == "Playful":
-            try:
-                style.configure("Accent.TButton", background=theme.get("accent"), foreground=theme.get("fg"))
-                self.start_btn.configure(style="Accent.TButton")
-                self.q25_btn.configure(style="Accent.TButton")
-                self.q50_btn.configure(style="Accent.TButton")
-            except Exception:
-                pass
+            self.style.configure("Accent.TButton", background=theme.get("accent"), foreground=theme.get("fg"))
+            button_style = "Accent.TButton"
         else:
-            try:
-                self.start_btn.configure(style="TButton")
-                self.q25_btn.configure(style="TButton")
-                self.q50_btn.configure(style="TButton")
-            except Exception:
-                pass
-        for k, lbl in self.badge_labels.items():
-            if k in self.badges:
-                lbl.configure(background=theme.get("accent2"), foreground=theme.get("fg"))
-            else:
-                lbl.configure(background=bg, foreground=theme.get("fg"))
+            button_style = "TButton"
+        for btn in (self.start_btn, self.q25_btn, self.q50_btn):
+            btn.configure(style=button_style)
 
     # Timer logic
+    def sync_durations(self):
+        self.engine.focus_min = self.focus_min.get()
+        self.engine.break_min = self.break_min.get()
+
     def on_duration_change(self):
+        self.sync_durations()
         self.is_focus = True
-        self.remaining = max(0, self.focus_min.get()) * 60
-        self.update_timer_display()
+        self.engine.set_remaining(max(0, self.focus_min.get()) * 60)
+        with self.tk_counter.measure("duration change"):
+            self.update_timer_display()
 
     def set_quick(self, f, b):
         self.focus_min.set(f);
         self.break_min.set(b)
+        self.sync_durations()
         self.is_focus = True;
-        self.remaining = self.focus_min.get() * 60
         self.is_running = False
-        self.update_all_texts();
-        self.update_timer_display()
+        self.engine.set_remaining(self.focus_min.get() * 60)
+        with self.tk_counter.measure("quick preset"):
+            self.refresh_view()
+            self.update_timer_display()
 
     def toggle_start_pause(self):
         if not self.is_running:
@@ -308,141 +883,140 @@ class ProductivityTimerApp:
         else:
             self.pause_timer()
 
+    def schedule_tick(self, ms):
+        # only ever one pending tick, even after quick pause/start toggles (the job
+        # may already have run; cancelling it then does nothing)
+        if self._tick_job is not None:
+            self.root.after_cancel(self._tick_job)
+        self._tick_job = self.root.after(ms, self.countdown_tick)
+
     def start_timer(self):
         if not self.is_running:
-            self.is_running = True
-            self.start_btn.config(text=self.strings["pause"])
+            self.sync_durations()
+            self.engine.start_timer()
+            self.view.update(running=True)
             self.countdown_tick()
 
     def pause_timer(self):
-        self.is_running = False
-        self.start_btn.config(text=self.strings["start"])
+        self.engine.pause_timer()
+        if self._tick_job is not None:
+            self.root.after_cancel(self._tick_job)
+            self._tick_job = None
+        self.view.update(running=False)
 
     def reset_timer(self, confirm=True):
+        from tkinter import messagebox
         proceed = True
         if confirm:
             proceed = messagebox.askyesno(self.strings["reset"], self.strings["confirm_reset"])
         if proceed:
-            if self.is_running:
-                elapsed_seconds = (self.focus_min.get()*60 if self.is_focus else self.break_min.get()*60) - self.remaining
-                minutes_elapsed = max(0, elapsed_seconds // 60)
-                typ = "focus" if self.is_focus else "break"
-                self.session_log.append({"time": now_iso(), "type": typ, "minutes": minutes_elapsed, "xp": 0, "success": False})
-            self.is_running = False
-            self.is_focus = True
-            self.remaining = self.focus_min.get() * 60
-            self.start_btn.config(text=self.strings["start"])
-            self.update_timer_display()
+            self.sync_durations()
+            self.engine.reset_timer()
+            with self.tk_counter.measure("reset"):
+                self.view.update(running=False)
+                self.update_timer_display()
 
     def countdown_tick(self):
         # This is the main timer loop that runs every second
-        # Stop the function if the user pressed Pause
-        if not self.is_running:
+        # The engine works out the time left (and finishes the session when it is up);
+        # it returns None if the user pressed Pause
+        wait_ms = self.engine.tick()
+        if wait_ms is None:
+            return
+        if self.hidden:
+            self.schedule_tick(self.hidden_wakeup_ms())
             return
-        # Check if time is up
-        if self.remaining <= 0:
-            self.complete_session(natural=True)
-            return # Stop this tick, complete_session will start the next one
         # Update the visual display (MM:SS and circle)
-        self.update_timer_display()
-        # Decrement the time
-        self.remaining -= 1
-        # Ask tkinter to call this function again after 1000ms (1 second)
-        self.root.after(1000, self.countdown_tick)
+        with self.tk_counter.measure("tick"):
+            self.update_timer_display()
+        # Wake up again right after the next second boundary
+        self.schedule_tick(wait_ms)
 
     def update_timer_display(self):
         mins = max(0, self.remaining // 60);
         secs = max(0, self.remaining % 60)
         mmss = f"{mins:02d}:{secs:02d}"
-        self.canvas.itemconfig(self.timer_text, text=mmss)
-        self.canvas.itemconfig(self.session_label, text=(self.strings["focus_min"] if self.is_focus else self.strings["break_min"]))
-        total = (self.focus_min.get()*60) if self.is_focus else (self.break_min.get()*60)
+        label = self.strings["focus_min"] if self.is_focus else self.strings["break_min"]
+        # only touch the canvas items whose text actually changed
+        if mmss != self._shown_mmss:
+            self._shown_mmss = mmss
+            self.canvas.itemconfig(self.timer_text, text=mmss)
+        if label != self._shown_label:
+            self._shown_label = label
+            self.canvas.itemconfig(self.session_label, text=label)
+        total = self.engine.session_length()
         if total <= 0: total = 1
         frac = 1 - (self.remaining / total)
         self.draw_progress(frac)
 
-    def draw_progress(self, fraction):
-        self.canvas.delete("arc") # Clear the old arc before drawing a new one
-        theme = THEMES.get(self.theme_name.get(), THEMES["Soft"])
-        acc = theme.get("accent", "#4A90E2");
-        acc2 = theme.get("accent2", "#6EC6A5")
+    # Progress ring: the track, arc and knob are created once and then only moved/recolored
+    RING_BOX = (40, 20, 360, 340) # bounding box of the circle
+    RING_START = -90 # start at 12 o'clock (top of the circle)
 
-        # Coords for the bounding box of the circle
-        x0, y0, x1, y1 = 40, 20, 360, 340;
+    def create_progress_ring(self):
+        x0, y0, x1, y1 = self.RING_BOX
+        # background "track" circle first, then the arc and the knob on top
+        self.ring_track = self.canvas.create_oval(x0, y0, x1, y1, width=28, tags="arc")
+        self.ring_arc = self.canvas.create_arc(x0, y0, x1, y1, start=self.RING_START, extent=0, style="arc", width=22, state="hidden", tags="arc")
+        self.ring_knob = self.canvas.create_oval(0, 0, 0, 0, outline="", state="hidden", tags="arc")
+        self._ring_extent = 0
+        self._shown_mmss = None
+        self._shown_label = None
 
-        start = -90 # Start at 12 o'clock (top of the circle)
+    def color_progress_ring(self, theme):
+        self.canvas.itemconfig(self.ring_track, outline=theme.get("progress_bg", "#EEE"))
+        self.canvas.itemconfig(self.ring_arc, outline=theme.get("accent", "#4A90E2"))
+        self.canvas.itemconfig(self.ring_knob, fill=theme.get("accent2", "#6EC6A5"))
+
+    def draw_progress(self, fraction):
         extent = int(360 * fraction) # The size of the arc (e.g., 0.5 fraction = 180 degrees)
-        # 1. Draw the background "track" circle first (in light grey)
-        self.canvas.create_oval(x0, y0, x1, y1, outline=theme.get("progress_bg", "#EEE"), width=28, tags="arc")
-        # 2. Draw the actual progress arc on top
+        if extent == self._ring_extent:
+            return # nothing visible changed since the last frame
         if extent > 0:
-            self.canvas.create_arc(x0, y0, x1, y1, start=start, extent=extent, style="arc", outline=acc, width=22, tags="arc")
-            angle = math.radians(start + extent)
-
+            self.canvas.itemconfig(self.ring_arc, extent=extent)
+            angle = math.radians(self.RING_START + extent)
             # Center X changed from 180 to 200
             cx, cy = 200 + math.cos(angle) * 140, 180 + math.sin(angle) * 140
-            self.canvas.create_oval(cx-9, cy-9, cx+9, cy+9, fill=acc2, outline="", tags="arc")
-
-    def complete_session(self, natural=True):
-        if natural:
-            typ = "focus" if self.is_focus else "break"
-            minutes = self.focus_min.get() if self.is_focus else self.break_min.get()
-            xp_gained = minutes if self.is_focus else 0
-            if self.is_focus:
-                self.xp += xp_gained
-                self._level_up_if_needed()
-                self.streak += 1
-            self.session_log.append({"time": now_iso(), "type": typ, "minutes": minutes, "xp": xp_gained, "success": True})
-            if self.is_focus:
-                self.check_badges()
-
-        # Play sound for each session end (no URL)
-        self.play_end_sound()
-
-        # Next session logic
-        if self.break_min.get() <= 0:
-            self.is_focus = True
-            self.remaining = self.focus_min.get() * 60
+            self.canvas.coords(self.ring_knob, cx-9, cy-9, cx+9, cy+9)
+            if self._ring_extent <= 0:
+                self.canvas.itemconfig(self.ring_arc, state="normal")
+                self.canvas.itemconfig(self.ring_knob, state="normal")
         else:
-            self.is_focus = not self.is_focus
-            self.remaining = (self.focus_min.get()*60) if self.is_focus else (self.break_min.get()*60)
+            self.canvas.itemconfig(self.ring_arc, state="hidden")
+            self.canvas.itemconfig(self.ring_knob, state="hidden")
+        self._ring_extent = extent
+
+    def on_engine_event(self, event, **data):
+        # called from inside engine.tick(): only post toasts here, nothing that blocks
+        if event == "badge":
+            self.toasts.notify(self.strings.get("badge_message", "You got {name} badge now. Congratulations!").format(name=data["name"]))
+        elif event == "level_up":
+            self.toasts.notify(self.strings["level_up"].format(level=data["level"]))
+        elif event == "session_complete":
+            entry = data["entry"]
+            if entry is not None:
+                done = self.strings["break_done"] if entry["type"] == "break" else self.strings["focus_done"].format(xp=entry["xp"])
+                self.toasts.notify(done, first=True)
+            self.on_session_complete(entry)
 
-        # Auto-start next
-        self.is_running = True
-        self.start_btn.config(text=self.strings["pause"])
+    def on_session_complete(self, entry=None):
+        # the engine has logged the session and already started the next one
+        # Play sound for each session end (no URL)
+        self.play_end_sound("break_end" if entry is not None and entry["type"] == "break" else "focus_end")
         self.save_progress()
-        self.update_all_texts()
-        self.update_timer_display()
-        self.root.after(1000, self.countdown_tick)
-
-    def _level_up_if_needed(self):
-        new_level = 1 + (self.xp // 50)
-        if new_level > self.level:
-            self.level = new_level
-
-    def check_badges(self):
-        for threshold in sorted(self.badge_thresholds):
-            if self.streak >= threshold and threshold not in self.badges:
-                self.badges.add(threshold)
-                name = self.badge_thresholds[threshold]
-                msg = self.strings.get("badge_message", "You got {name} badge now. Congratulations!").format(name=name)
-                messagebox.showinfo(self.strings.get("badge_earned", "Badge"), msg)
-        self.apply_theme()
-
-    def play_end_sound(self):
+        if self.hidden:
+            self._stale = True
+            return
+        with self.tk_counter.measure("session complete"):
+            self.refresh_view()
+            self.update_timer_display()
+
+    def play_end_sound(self, cue="focus_end"):
         if self.muted.get():
             return
-        
-        try:
-            if HAVE_WINSOUND:
-                # Use winsound if available (it's non-blocking)
-                winsound.Beep(880, 300)
-            else:
-                # Fallback for Mac/Linux
-                self.root.bell()
-        except Exception as e:
-            # If sound fails, just print a warning to the console
-            print(f"Warning: Could not play sound. Error: {e}")
+        # only queued here, the audio thread plays it; the bell if there is no player
+        if not self.audio.play(cue):
+            self.root.bell()
 
     # settings / export / reset
     def open_settings(self):
@@ -458,42 +1032,229 @@ class ProductivityTimerApp:
         # Dyslexia toggle restored (no description)
         ttk.Checkbutton(win, text=self.strings.get("dyslexia_font", "Dyslexia font"), variable=self.dyslexia_font, command=self.on_dyslexia_toggle).grid(row=2, column=0, columnspan=3, padx=6, pady=6, sticky="w")
         ttk.Checkbutton(win, text=self.strings["mute"], variable=self.muted).grid(row=3, column=0, columnspan=3, padx=6, pady=6, sticky="w")
-        ttk.Button(win, text=self.strings.get("reset_data", "Reset Data"), command=self.reset_data_confirm).grid(row=4, column=0, columnspan=3, pady=(8,10))
-        ttk.Button(win, text="Close", command=win.destroy).grid(row=5, column=0, columnspan=3, pady=6)
+        ttk.Button(win, text=self.strings["import"], command=self.import_history).grid(row=4, column=0, columnspan=3, pady=(8,0))
+        ttk.Button(win, text=self.strings.get("reset_data", "Reset Data"), command=self.reset_data_confirm).grid(row=5, column=0, columnspan=3, pady=(8,10))
+        ttk.Button(win, text="Close", command=win.destroy).grid(row=6, column=0, columnspan=3, pady=6)
 
     def on_dyslexia_toggle(self):
-        self.apply_font_family()
+        with self.tk_counter.measure("dyslexia toggle"):
+            self.apply_font_family()
         self.save_settings()
 
     def reset_data_confirm(self):
+        from tkinter import messagebox
         ok = messagebox.askyesno(self.strings.get("reset_data", "Reset Data"), self.strings.get("reset_data_confirm", "Clear all saved settings and session history?"))
         if not ok:
             return
-        try:
-            if os.path.exists(APP_STATE_FILE):
-                os.unlink(APP_STATE_FILE)
-        except Exception:
-            pass
+        self.finish_history_load()
+        self.writer.discard()
+        self.storage.clear()
         self.state = {}
-        self.xp = 0; self.level = 1; self.streak = 0; self.badges = set(); self.session_log = []
+        self.xp = 0; self.level = 1; self.streak = 0; self.badges = set()
+        self.session_log = self.storage.load_state()["session_log"]
+        self.engine.reevaluate_achievements(force=True)
+        self.engine.stats = SessionStats()
         self.focus_min.set(25); self.break_min.set(5); self.theme_name.set("Soft"); self.font_size.set(14)
+        self.sync_durations()
         self.dyslexia_font.set(False); self.muted.set(False)
         messagebox.showinfo(self.strings.get("reset_data", "Reset Data"), "Data cleared.")
-        self.apply_font_family(); self.apply_theme(); self.update_all_texts(); self.update_timer_display()
+        self.apply_font_family(); self.update_timer_display()
 
     def export_csv(self):
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")], title=self.strings["export"])
-        if not file_path:
+        from tkinter import messagebox, filedialog
+        if self.export_job is not None and not self.export_job.finished:
+            return # one export at a time
+        win = tk.Toplevel(self.root)
+        win.title(self.strings["export"]); win.transient(self.root)
+        start_date = tk.StringVar(); end_date = tk.StringVar()
+        want_focus = tk.BooleanVar(value=True); want_break = tk.BooleanVar(value=True)
+        compress = tk.BooleanVar(value=False)
+        ttk.Label(win, text=self.strings["export_from"]).grid(row=0, column=0, sticky="w", padx=6, pady=6)
+        ttk.Entry(win, textvariable=start_date, width=12).grid(row=0, column=1, sticky="w", padx=6)
+        ttk.Label(win, text=self.strings["export_to"]).grid(row=1, column=0, sticky="w", padx=6, pady=6)
+        ttk.Entry(win, textvariable=end_date, width=12).grid(row=1, column=1, sticky="w", padx=6)
+        ttk.Checkbutton(win, text=self.strings["export_focus"], variable=want_focus).grid(row=2, column=0, sticky="w", padx=6)
+        ttk.Checkbutton(win, text=self.strings["export_break"], variable=want_break).grid(row=2, column=1, sticky="w", padx=6)
+        ttk.Checkbutton(win, text=self.strings["export_gzip"], variable=compress).grid(row=3, column=0, columnspan=2, sticky="w", padx=6, pady=6)
+
+        def go():
+            dates = [start_date.get().strip() or None, end_date.get().strip() or None]
+            try:
+                day_bounds(*dates)
+            except ValueError:
+                messagebox.showerror(self.strings["export"], self.strings["bad_date"], parent=win)
+                return
+            types = [t for t, on in (("focus", want_focus.get()), ("break", want_break.get())) if on]
+            ext = ".csv.gz" if compress.get() else ".csv"
+            file_path = filedialog.asksaveasfilename(defaultextension=ext, filetypes=[("CSV files","*"+ext)], title=self.strings["export"], parent=win)
+            if not file_path:
+                return
+            if compress.get() and not file_path.endswith(".gz"):
+                file_path += ".gz"
+            win.destroy()
+            self.export_job = ExportJob(self.session_log, file_path, dates[0], dates[1], types).start()
+            self.show_export_progress(self.export_job)
+
+        ttk.Button(win, text=self.strings["export"], command=go).grid(row=4, column=0, columnspan=2, pady=(8,10))
+
+    def show_export_progress(self, job):
+        from tkinter import messagebox
+        # non-modal, so the countdown keeps running while the worker writes
+        win = tk.Toplevel(self.root)
+        win.title(self.strings["exporting"]); win.transient(self.root)
+        bar = ttk.Progressbar(win, length=260, maximum=max(1, job.total))
+        bar.grid(row=0, column=0, padx=10, pady=10)
+        ttk.Button(win, text=self.strings["cancel"], command=job.cancel).grid(row=1, column=0, pady=(0,10))
+        win.protocol("WM_DELETE_WINDOW", job.cancel)
+
+        def poll():
+            if not job.finished:
+                bar.configure(value=job.done)
+                self.root.after(100, poll)
+                return
+            win.destroy()
+            if job.error is not None:
+                messagebox.showerror(self.strings["export"], self.strings["save_error"])
+            elif job.cancelled:
+                self.toasts.notify(self.strings["export_cancelled"])
+            else:
+                self.toasts.notify(self.strings["session_log_saved"])
+        poll()
+
+    def import_history(self):
+        from tkinter import filedialog
+        from focus_import import ImportJob, IMPORT_PATTERNS
+        if self.import_job is not None:
+            return # one import at a time
+        paths = filedialog.askopenfilenames(title=self.strings["import"], filetypes=[("Focus+ history", " ".join(IMPORT_PATTERNS)), ("All files", "*")])
+        if not paths:
             return
-        try:
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["time", "type", "minutes", "xp", "success"])
-                for r in self.session_log:
-                    writer.writerow([r.get("time",""), r.get("type",""), r.get("minutes",""), r.get("xp",""), r.get("success", False)])
-            messagebox.showinfo(self.strings["export"], self.strings["session_log_saved"])
-        except Exception:
-            messagebox.showerror(self.strings["export"], self.strings["save_error"])
+        self.finish_history_load()
+        self.import_job = ImportJob(paths, self.storage, self.session_log, self.achievements).start()
+        self.show_import_progress(self.import_job)
+
+    def show_import_progress(self, job):
+        from tkinter import messagebox
+        win = tk.Toplevel(self.root)
+        win.title(self.strings["importing"]); win.transient(self.root)
+        bar = ttk.Progressbar(win, length=260, maximum=max(1, job.total))
+        bar.grid(row=0, column=0, padx=10, pady=10)
+        ttk.Button(win, text=self.strings["cancel"], command=job.cancel).grid(row=1, column=0, pady=(0,10))
+        win.protocol("WM_DELETE_WINDOW", job.cancel)
+
+        def poll():
+            if self.import_job is not job:
+                return # already finished by on_close()
+            if not job.finished:
+                bar.configure(value=job.done)
+                self.root.after(100, poll)
+                return
+            win.destroy()
+            self.finish_import(job)
+            if job.error is not None:
+                messagebox.showerror(self.strings["import"], f"{self.strings['save_error']}: {job.error}")
+            elif job.result is None:
+                self.toasts.notify(self.strings["import_cancelled"])
+            elif job.result["failed"]: # the list of files needs a dialog that stays up
+                r = job.result
+                msg = self.strings["import_done"].format(**r)
+                msg += "\n\n" + self.strings["import_failed"] + "\n" + "\n".join(r["failed"][:10])
+                messagebox.showinfo(self.strings["import"], msg)
+            else:
+                self.toasts.notify(self.strings["import_done"].format(**job.result))
+        poll()
+
+    def finish_import(self, job):
+        # swap in the merged history; sessions finished while the import ran go on top
+        self.import_job = None
+        if job.result is None:
+            return
+        # the stats and progress over the merged log were worked out on the import
+        # thread; only the newer sessions are counted here
+        merged, stats, progress = job.result["log"], job.result["stats"], job.result["progress"]
+        tracker = AchievementTracker(self.achievements, progress["achievements"])
+        xp = progress["xp"]
+        newer = self.session_log[job.local_rows:]
+        if isinstance(self.session_log, SessionStore):
+            log = merged # JSON storage: the merged log is what the snapshot now holds
+        else:
+            log = self.storage.load_history()
+        log.extend(newer)
+        for entry in newer:
+            stats.add(entry)
+            tracker.add(entry)
+            xp += int(entry.get("xp", 0) or 0)
+        tracker.take_new()
+        self.session_log = log
+        self.engine.stats = stats
+        self.engine.tracker = tracker
+        self.xp, self.level, self.streak = xp, self.achievements.levels.level(xp), tracker.streak
+        self.badges = self.achievements.earned(tracker.values())
+        self.save_progress()
+        self.refresh_view()
+
+    def open_debug_panel(self):
+        # hidden (Ctrl+Shift+D with --telemetry): live view of the telemetry histograms
+        win = tk.Toplevel(self.root)
+        win.title("Telemetry"); win.transient(self.root)
+        columns = ("count", "mean", "p50", "p99", "max")
+        tree = ttk.Treeview(win, columns=columns, height=10)
+        tree.heading("#0", text="ms")
+        tree.column("#0", width=170)
+        for c in columns:
+            tree.heading(c, text=c)
+            tree.column(c, width=70, anchor="e")
+        tree.grid(row=0, column=0, padx=6, pady=6)
+        counters = ttk.Label(win, justify="left")
+        counters.grid(row=1, column=0, sticky="w", padx=6, pady=(0,6))
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            snap = self.telemetry.snapshot()
+            tree.delete(*tree.get_children())
+            for name, h in snap["histograms"].items():
+                tree.insert("", "end", text=name, values=(h["count"], h["mean_ms"], h["p50_ms"], h["p99_ms"], h["max_ms"]))
+            counters.configure(text="\n".join(f"{k}: {v}" for k, v in sorted(snap["counters"].items())))
+            win.after(1000, refresh)
+        refresh()
+
+    def open_history(self):
+        if self.history_window is not None and self.history_window.alive():
+            self.history_window.win.lift()
+            return
+        self.finish_history_load()
+        self.history_window = HistoryWindow(self.root, self.strings, self.session_log)
+
+    def open_stats(self):
+        # everything shown here comes straight from the running totals
+        stats = self.engine.stats
+        today = now_iso()[:10]
+        s = self.strings
+        win = tk.Toplevel(self.root)
+        win.title(s["stats"]); win.transient(self.root)
+        rows = [
+            (s["today"], f"{stats.focus_minutes_on(today)} {s['minutes']}"),
+            (s["this_week"], f"{stats.focus_minutes_in_week(today)} {s['minutes']}"),
+            (s["this_month"], f"{stats.focus_minutes_in_month(today)} {s['minutes']}"),
+            (s["completed"], stats.completed),
+            (s["aborted"], stats.aborted),
+            (s["completion_rate"], f"{stats.completion_rate():.0%}"),
+            (s["longest_streak"], stats.longest_run),
+            (s["longest_day_streak"], stats.longest_day_run),
+            (s["badges"], f"{len(self.badges)} / {len(self.achievements.rules)}"),
+        ]
+        for r, (name, value) in enumerate(rows):
+            ttk.Label(win, text=name).grid(row=r, column=0, sticky="w", padx=8, pady=2)
+            ttk.Label(win, text=str(value)).grid(row=r, column=1, sticky="e", padx=8, pady=2)
+        ttk.Label(win, text=s["last_7_days"], font=(None, 10, "bold")).grid(row=len(rows), column=0, sticky="w", padx=8, pady=(10,2))
+        days = stats.last_days(7, today)
+        most = max([m for _, m in days] + [1])
+        for r, (day, minutes) in enumerate(days, start=len(rows) + 1):
+            ttk.Label(win, text=day[5:]).grid(row=r, column=0, sticky="w", padx=8)
+            ttk.Progressbar(win, length=160, maximum=most, value=minutes).grid(row=r, column=1, padx=8, pady=1)
+            ttk.Label(win, text=str(minutes)).grid(row=r, column=2, sticky="e", padx=8)
+        ttk.Button(win, text="Close", command=win.destroy).grid(row=len(rows) + 9, column=0, columnspan=3, pady=8)
 
     def change_language(self, code):
         if code not in LOCALES:
@@ -501,35 +1262,18 @@ class ProductivityTimerApp:
         self.locale = code
         self.strings = LOCALES[self.locale]
         self.save_settings()
-        self.update_all_texts()
-
-    def update_all_texts(self):
-        self.root.title(self.strings["title"])
-        self.start_btn.config(text=self.strings["start"] if not self.is_running else self.strings["pause"])
-        self.reset_btn.config(text=self.strings["reset"])
-        self.q25_btn.config(text=self.strings["quick_25_5"])
-        self.q50_btn.config(text=self.strings["quick_50_10"])
-        self.xp_label.config(text=f"{self.strings['xp']}: {self.xp}")
-        self.level_label.config(text=f"{self.strings['level']}: {self.level}")
-        self.streak_label.config(text=f"{self.strings['streak']}: {self.streak}")
-        self.focus_label.config(text=self.strings["focus_min"])
-        self.break_label.config(text=self.strings["break_min"])
-        self.focus_note.config(text=self.strings["focus_label_note"])
-        self.break_note.config(text=self.strings["break_label_note"])
-        self.settings_btn.config(text=self.strings["settings"])
-        self.export_btn.config(text=self.strings["export"])
-        self.apply_theme()
-        self.update_timer_display()
+        with self.tk_counter.measure("language"):
+            self.refresh_view()
 
     def on_theme_change(self):
-        self.apply_theme(); self.save_settings()
+        with self.tk_counter.measure("theme"):
+            self.view.update(theme=self.theme_name.get())
+        self.save_settings()
 
     def on_font_change(self):
-        style = ttk.Style()
-        style.configure("TButton", font=("Helvetica", max(10, self.font_size.get())))
-        style.configure("TLabel", font=("Helvetica", max(10, self.font_size.get())))
-        self.canvas.itemconfig(self.timer_text, font=("Helvetica", self.font_size.get()+18, "bold"))
-        self.canvas.itemconfig(self.session_label, font=("Helvetica", max(10, self.font_size.get()-2)))
+        # the slider fires for every pixel dragged; only whole sizes reach the widgets
+        with self.tk_counter.measure("font size"):
+            self.view.update(font=(self.font_family, self.font_size.get()))
         self.save_settings()
 
     def save_settings(self):
@@ -540,28 +1284,87 @@ class ProductivityTimerApp:
         self.state["muted"] = self.muted.get()
         self.state["focus_min"] = self.focus_min.get()
         self.state["break_min"] = self.break_min.get()
-        save_state(self.state)
+        self.writer.submit(self.state)
 
     def save_progress(self):
         self.state["xp"] = self.xp
         self.state["level"] = self.level
         self.state["streak"] = self.streak
         self.state["badges"] = list(self.badges)
-        self.state["session_log"] = self.session_log
+        self.state["achievements"] = self.engine.tracker.to_dict()
+        self.state["stats"] = self.engine.stats.to_dict()
+        # not before the history has loaded (it goes out merged), nor while an import
+        # is rewriting it (finish_import() saves)
+        if self.history_loaded and self.import_job is None:
+            self.storage.save_sessions(self.session_log)
         self.save_settings()
 
     def on_close(self):
-        if self.is_running:
-            elapsed_seconds = (self.focus_min.get()*60 if self.is_focus else self.break_min.get()*60) - self.remaining
-            minutes_elapsed = max(0, elapsed_seconds // 60)
-            typ = "focus" if self.is_focus else "break"
-            self.session_log.append({"time": now_iso(), "type": typ, "minutes": minutes_elapsed, "xp": 0, "success": False})
+        if self.export_job is not None and not self.export_job.finished:
+            self.export_job.cancel()
+            self.export_job.thread.join(timeout=2) # let it remove its partial file
+        if self.import_job is not None:
+            self.import_job.cancel()
+            self.import_job.thread.join() # it may be writing the merged history
+            self.finish_import(self.import_job)
+        self.finish_history_load()
+        self.engine.abort_session()
         self.save_progress()
+        self.storage.compact(self.session_log, force=False)
+        self.writer.close()
+        self.storage.close()
+        self.audio.close()
+        self.tk_counter.report()
+        self.telemetry.dump()
         self.root.destroy()
 
+class StartupProfiler:
+    # --profile-startup: wall time of each startup phase, printed to stderr once
+    # the deferred work (fonts, history) is done
+    def __init__(self, enabled=True, start=None):
+        self.enabled = enabled
+        self.start = self.last = start if start is not None else time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        # time since the previous mark
+        if self.enabled:
+            now = time.perf_counter()
+            self.phases.append((name, now - self.last))
+            self.last = now
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.phases.append((name, seconds))
+
+    def reset_clock(self):
+        # the next mark starts counting from here (skips idle time in the event loop)
+        self.last = time.perf_counter()
+
+    def report(self, sessions):
+        if not self.enabled:
+            return
+        print(f"startup profile ({sessions} sessions in history):", file=sys.stderr)
+        for name, seconds in self.phases:
+            print(f"  {name:22s} {seconds * 1000:8.1f} ms", file=sys.stderr)
+        print(f"  {'total wall time':22s} {(time.perf_counter() - self.start) * 1000:8.1f} ms", file=sys.stderr)
+        self.enabled = False
+
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Focus+ productivity timer")
+    parser.add_argument("--storage", choices=["json", "sqlite"], help="where to keep settings and history (default: sqlite if productivity_timer.db exists, else json)")
+    parser.add_argument("--profile-startup", action="store_true", help="print how long each startup phase took")
+    parser.add_argument("--count-tk-calls", action="store_true", help="print the Tk calls made per UI event on exit")
+    parser.add_argument("--telemetry", nargs="?", const="focus_telemetry.json", metavar="FILE",
+                        help="time ticks, drawing and saves; Ctrl+Shift+D shows them, FILE gets them on exit")
+    args = parser.parse_args()
+    profiler = StartupProfiler(args.profile_startup, start=_PROCESS_START)
+    profiler.mark("imports")
     root = tk.Tk()
-    app = ProductivityTimerApp(root)
+    profiler.mark("create window")
+    app = ProductivityTimerApp(root, open_storage(args.storage), profiler, TkCallCounter(args.count_tk_calls),
+                               Telemetry(args.telemetry is not None, args.telemetry))
     root.mainloop()
 
 if __name__ == "__main__":
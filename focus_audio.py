@@ -0,0 +1,136 @@
+# Sound cues played on a worker thread, so a beep never holds up the Tk event
+# loop or the next tick. Each cue is synthesized once into an in-memory WAV and
+# handed to whatever player this machine has: winsound on Windows, afplay on
+# macOS, paplay/pw-play/aplay on Linux. Without one (or once every player there
+# failed to play, e.g. no sound device), play() returns False and the caller falls
+# back to the Tk bell.
+import array, io, math, os, queue, shutil, subprocess, sys, tempfile, threading, wave
+
+# optional audio libs (only winsound)
+try:
+    import winsound
+    HAVE_WINSOUND = True
+except Exception:
+    HAVE_WINSOUND = False
+
+SAMPLE_RATE = 22050
+VOLUME = 0.4
+FADE_MS = 8 # ramp in/out so the tones don't click
+# cue -> [(frequency Hz, milliseconds)]; a frequency of 0 is a pause
+CUES = {
+    "focus_end": [(880, 300)], # the old winsound.Beep(880, 300)
+    "break_end": [(660, 120), (0, 40), (880, 180)],
+}
+PLAYER_COMMANDS = (["afplay"],) if sys.platform == "darwin" else (["paplay"], ["pw-play"], ["aplay", "-q"])
+
+def synthesize(notes, rate=SAMPLE_RATE, volume=VOLUME):
+    # 16-bit mono WAV bytes of a sequence of sine tones
+    samples = array.array("h")
+    fade = int(rate * FADE_MS / 1000)
+    for freq, ms in notes:
+        n = int(rate * ms / 1000)
+        if not freq:
+            samples.extend(array.array("h", bytes(2 * n)))
+            continue
+        step = 2 * math.pi * freq / rate
+        for i in range(n):
+            envelope = min(1.0, i / fade, (n - i) / fade) if fade else 1.0
+            samples.append(int(32767 * volume * envelope * math.sin(step * i)))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+class AudioPlayer:
+    # play(cue) only queues the cue; the worker thread finds a backend, renders and
+    # caches the WAVs, and plays them one at a time. A cue asked for while another
+    # is still waiting is dropped instead of piling up.
+    def __init__(self, cues=CUES):
+        self.cues = cues
+        self.available = True # until the worker finds out there is no way to play sound
+        self._wavs = {}
+        self._files = {} # cue -> temp .wav for command line players
+        self._commands = [] # players installed here, the one in use first
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def play(self, cue):
+        if not self.available:
+            return False
+        try:
+            self._queue.put_nowait(cue)
+        except queue.Full:
+            pass
+        return True
+
+    def close(self):
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=1)
+        for path in self._files.values():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _find_backend(self):
+        if HAVE_WINSOUND:
+            return True
+        self._commands = [command for command in PLAYER_COMMANDS if shutil.which(command[0])]
+        return bool(self._commands)
+
+    def wav(self, cue):
+        data = self._wavs.get(cue)
+        if data is None:
+            data = self._wavs[cue] = synthesize(self.cues[cue])
+        return data
+
+    def _play(self, cue):
+        # True if the cue was played
+        if HAVE_WINSOUND:
+            try:
+                winsound.PlaySound(self.wav(cue), winsound.SND_MEMORY)
+            except RuntimeError: # no sound device
+                return False
+            return True
+        path = self._files.get(cue)
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix=f"focus-{cue}-", suffix=".wav")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.wav(cue))
+            self._files[cue] = path
+        try:
+            done = subprocess.run(self._commands[0] + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return done.returncode == 0
+
+    def _run(self):
+        if not self._find_backend():
+            self.available = False
+            return
+        for cue in self.cues: # render up front, not when the session ends
+            self.wav(cue)
+        while True:
+            cue = self._queue.get()
+            if cue is None:
+                return
+            try:
+                while not self._play(cue):
+                    # the player is installed but can't play here (no device, no sound
+                    # server): try the next one, and give up on sound when none works
+                    if HAVE_WINSOUND or len(self._commands) < 2:
+                        self.available = False
+                        return
+                    self._commands.pop(0)
+            except Exception as e:
+                print(f"Warning: Could not play sound. Error: {e}", file=sys.stderr)
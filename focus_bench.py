@@ -0,0 +1,278 @@
+# Micro-benchmarks for the Focus+ timer that run without a display.
+# Usage: python focus_bench.py ring [--fps 10] [--minutes 25]
+#        python focus_bench.py engine [--sessions 1000000]
+#        python focus_bench.py suite [--sizes 1k,10k,100k,1M] [--out focus_bench_results.json]
+#                                    [--baseline FILE] [--tolerance 0.25]
+import argparse, json, math, os, platform, random, shutil, sys, tempfile, time
+
+import Final_PY_SuXieJung as app
+from focus_engine import TimerEngine, SessionStats, SessionStore, SESSION_TYPES, make_simulation, now_iso, parse_time, progress_from_log, simulate
+from focus_storage import JsonStorage, SqliteStorage, ExportJob
+
+SUITE_SIZES = "1k,10k,100k,1M" # 10M works too, but takes minutes and a few GB
+SUITE_RESULTS_FILE = "focus_bench_results.json"
+# a timing only counts as a regression when it is this much slower than the baseline,
+# both relative and in absolute seconds (so sub-millisecond noise is ignored)
+SUITE_TOLERANCE = 0.25
+SUITE_MIN_SECONDS = 0.02
+
+class CountingCanvas:
+    # Stand-in for tk.Canvas: accepts the same calls and counts them
+    def __init__(self):
+        self.calls = 0
+        self._next_id = 0
+
+    def _new_item(self, *args, **kw):
+        self.calls += 1
+        self._next_id += 1
+        return self._next_id
+
+    create_oval = create_arc = create_text = _new_item
+
+    def itemconfig(self, *args, **kw):
+        self.calls += 1
+
+    def coords(self, *args):
+        self.calls += 1
+
+    def delete(self, *args):
+        self.calls += 1
+
+class Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+def make_headless_app(focus_min=25, break_min=5):
+    # a ProductivityTimerApp with just enough state to render the timer
+    a = app.ProductivityTimerApp.__new__(app.ProductivityTimerApp)
+    a.canvas = CountingCanvas()
+    a.strings = app.LOCALES["en"]
+    a.theme_name = Var("Soft")
+    a.focus_min = Var(focus_min)
+    a.break_min = Var(break_min)
+    a.engine = TimerEngine(focus_min, break_min)
+    a.create_progress_ring()
+    a.timer_text = a.canvas.create_text(200, 160, text="")
+    a.session_label = a.canvas.create_text(200, 220, text="")
+    a.color_progress_ring(app.THEMES["Soft"])
+    return a
+
+def draw_progress_immediate(canvas, theme_name, fraction):
+    # the old draw_progress(): throw the ring away and rebuild it every frame
+    canvas.delete("arc")
+    theme = app.THEMES.get(theme_name, app.THEMES["Soft"])
+    acc = theme.get("accent", "#4A90E2")
+    acc2 = theme.get("accent2", "#6EC6A5")
+    x0, y0, x1, y1 = 40, 20, 360, 340
+    start = -90
+    extent = int(360 * fraction)
+    canvas.create_oval(x0, y0, x1, y1, outline=theme.get("progress_bg", "#EEE"), width=28, tags="arc")
+    if extent > 0:
+        canvas.create_arc(x0, y0, x1, y1, start=start, extent=extent, style="arc", outline=acc, width=22, tags="arc")
+        angle = math.radians(start + extent)
+        cx, cy = 200 + math.cos(angle) * 140, 180 + math.sin(angle) * 140
+        canvas.create_oval(cx-9, cy-9, cx+9, cy+9, fill=acc2, outline="", tags="arc")
+
+def update_display_immediate(a):
+    # the old update_timer_display(): both texts and the whole ring on every frame
+    mins, secs = a.remaining // 60, a.remaining % 60
+    a.canvas.itemconfig(a.timer_text, text=f"{mins:02d}:{secs:02d}")
+    a.canvas.itemconfig(a.session_label, text=a.strings["focus_min"] if a.is_focus else a.strings["break_min"])
+    total = a.focus_min.get() * 60
+    draw_progress_immediate(a.canvas, a.theme_name.get(), 1 - a.remaining / total)
+
+def bench_ring(fps=10, minutes=25):
+    # renders one focus session at `fps` frames per second of timer time
+    results = {}
+    for name, render in (("immediate", update_display_immediate), ("retained", app.ProductivityTimerApp.update_timer_display)):
+        a = make_headless_app(focus_min=minutes)
+        a.canvas.calls = 0
+        frames = minutes * 60 * fps
+        t0 = time.perf_counter()
+        for frame in range(frames):
+            a.remaining = minutes * 60 - frame // fps
+            render(a)
+        elapsed = time.perf_counter() - t0
+        results[name] = {"frames": frames, "tk_calls": a.canvas.calls,
+                         "tk_calls_per_frame": a.canvas.calls / frames,
+                         "us_per_frame": elapsed / frames * 1e6}
+    return results
+
+def bench_engine(sessions=1000000):
+    # focus/break cycles on a virtual clock, as fast as the engine can go
+    engine, vclock = make_simulation(25, 5)
+    t0 = time.perf_counter()
+    simulate(engine, vclock, sessions)
+    elapsed = time.perf_counter() - t0
+    return {"sessions": sessions, "seconds": elapsed, "sessions_per_minute": sessions / elapsed * 60,
+            "xp": engine.xp, "level": engine.level, "streak": engine.streak}
+
+# Persistence / export / rendering suite
+def parse_size(text):
+    # "1k" -> 1000, "10M" -> 10000000
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+def synthetic_history(n, seed=1, start="2020-01-01 08:00:00"):
+    # n sessions as a SessionStore: focus/break pairs of a few common lengths,
+    # about one in ten aborted early, a handful of working days a week
+    rng = random.Random(seed)
+    store = SessionStore()
+    focus, brk = SESSION_TYPES.index("focus"), SESSION_TYPES.index("break")
+    t = parse_time(start)
+    day_start = t
+    while len(store) < n:
+        focus_min, break_min = rng.choice(((25, 5), (25, 5), (50, 10), (45, 15)))
+        if rng.random() < 0.1:
+            minutes = rng.randrange(focus_min)
+            t += minutes * 60
+            store.append_fields(t, focus, minutes, 0, False)
+        else:
+            t += focus_min * 60
+            store.append_fields(t, focus, focus_min, focus_min, True)
+            if len(store) < n:
+                t += break_min * 60
+                store.append_fields(t, brk, break_min, 0, True)
+        if t - day_start > 10 * 3600: # end of the working day
+            day_start += 86400 * rng.choice((1, 1, 1, 1, 3))
+            t = day_start
+    return store
+
+def _best(fn, repeat):
+    # fastest of `repeat` runs, in seconds
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_storage(kind, history, folder, repeat=1):
+    # timings for one backend and one history size; every step is what the app does
+    results = {}
+    if kind == "json":
+        files = [os.path.join(folder, name) for name in ("state.json", "journal.jsonl", "history.json")]
+        make_storage = lambda: JsonStorage(*files)
+    else:
+        db = os.path.join(folder, "timer.db")
+        make_storage = lambda: SqliteStorage(db, migrate_from=False)
+    storage = make_storage()
+    # the whole history written at once (import, JSON compaction)
+    results["write_history"] = _best(lambda: storage.replace_sessions(history), repeat)
+    stats = SessionStats()
+    stats.rebuild(history)
+    state = {"focus_min": 25, "break_min": 5, "theme": "Soft", "locale": "en", "font_size": 14,
+             "xp": sum(history.xp), "level": 1, "streak": 0, "badges": [], "stats": stats.to_dict()}
+    results["save_state"] = _best(lambda: storage.save_state(state), repeat)
+    storage.close()
+
+    loaded = {}
+    def load():
+        s = make_storage()
+        loaded["state"] = s.load_settings()
+        loaded["log"] = s.load_history()
+        loaded["storage"] = s
+    results["load"] = _best(load, repeat) # startup: settings, then the history
+    storage, log = loaded["storage"], loaded["log"]
+    # everything that walks the history once it is loaded
+    results["stats_rebuild"] = _best(lambda: SessionStats().rebuild(log), repeat)
+    results["achievements"] = _best(lambda: progress_from_log(log), repeat)
+
+    def save_progress():
+        # one session ends: the new entry plus the settings/progress
+        log.append({"time": now_iso(), "type": "focus", "minutes": 25, "xp": 25, "success": True})
+        storage.save_sessions(log)
+        storage.save_state(state)
+    results["save_progress"] = _best(save_progress, repeat)
+
+    csv_path = os.path.join(folder, "export.csv")
+    def export():
+        job = ExportJob(log, csv_path).start()
+        job.thread.join()
+        if job.error is not None:
+            raise job.error
+    results["export_csv"] = _best(export, repeat)
+    storage.close()
+    return results
+
+def run_suite(sizes, kinds=("json", "sqlite"), repeat=3):
+    # {"<kind>/<size>/<step>": seconds, "render/...": ...}; histories of a million
+    # sessions or more are timed once instead of `repeat` times
+    results = {}
+    ring = bench_ring()
+    results["render/tk_calls_per_frame"] = ring["retained"]["tk_calls_per_frame"]
+    results["render/seconds_per_frame"] = ring["retained"]["us_per_frame"] / 1e6
+    for n in sizes:
+        t0 = time.perf_counter()
+        history = synthetic_history(n)
+        print(f"{n:>10,} sessions generated in {time.perf_counter() - t0:.2f} s", file=sys.stderr)
+        for kind in kinds:
+            folder = tempfile.mkdtemp(prefix="focus-bench-")
+            try:
+                timings = bench_storage(kind, history, folder, repeat if n < 1000000 else 1)
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+            for step, seconds in timings.items():
+                results[f"{kind}/{n}/{step}"] = seconds
+    return results
+
+def compare(results, baseline, tolerance=SUITE_TOLERANCE, min_seconds=SUITE_MIN_SECONDS):
+    # [(key, baseline, now, ratio)] for every timing noticeably slower than the baseline
+    slower = []
+    for key, now in results.items():
+        before = baseline.get(key)
+        if not before or now <= before * (1 + tolerance):
+            continue
+        # per-frame numbers are tiny by nature; everything else must also lose min_seconds
+        if key.startswith("render/") or now - before >= min_seconds:
+            slower.append((key, before, now, now / before))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Focus+ timer micro-benchmarks")
+    parser.add_argument("bench", choices=["ring", "engine", "suite"])
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--minutes", type=int, default=25)
+    parser.add_argument("--sessions", type=int, default=1000000)
+    parser.add_argument("--sizes", default=SUITE_SIZES, help="history sizes, e.g. 1k,10k,100k,1M,10M")
+    parser.add_argument("--storage", default="json,sqlite", help="backends to time")
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs (below 1M sessions)")
+    parser.add_argument("--out", default=SUITE_RESULTS_FILE)
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=SUITE_TOLERANCE)
+    args = parser.parse_args()
+    if args.bench == "ring":
+        for name, r in bench_ring(args.fps, args.minutes).items():
+            print(f"{name:10s} frames={r['frames']:6d}  tk calls/frame={r['tk_calls_per_frame']:.2f}  time/frame={r['us_per_frame']:.2f} us")
+    elif args.bench == "engine":
+        r = bench_engine(args.sessions)
+        print(f"{r['sessions']} sessions in {r['seconds']:.2f} s ({r['sessions_per_minute']:,.0f} per minute), level {r['level']}, streak {r['streak']}")
+    elif args.bench == "suite":
+        sizes = [parse_size(s) for s in args.sizes.split(",")]
+        results = run_suite(sizes, [k.strip() for k in args.storage.split(",")], args.repeat)
+        for key, value in results.items():
+            print(f"{key:40s} {value:12.6f}")
+        report = {"created": now_iso(), "python": platform.python_version(), "platform": platform.platform(),
+                  "results": results}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.out}")
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+            slower = compare(results, baseline, args.tolerance)
+            for key, before, now, ratio in slower:
+                print(f"SLOWER  {key:40s} {before:.6f} -> {now:.6f} ({ratio:.2f}x)")
+            print(f"{len(slower)} of {len(set(results) & set(baseline))} timings slower than {args.baseline}")
+            sys.exit(1 if slower else 0)
+
+if __name__ == "__main__":
+    main()
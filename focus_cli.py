@@ -0,0 +1,288 @@
+# Focus+ in a terminal: the same timer, state file and gamification rules as the
+# desktop app, without Tkinter (so it starts fast and works over SSH).
+# Usage: python focus_cli.py run [--focus 25] [--break 5] [--cycles 1]
+#        python focus_cli.py stats
+#        python focus_cli.py export FILE [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--type focus]
+#        python focus_cli.py settings [key=value ...]
+#
+# Don't run it against the same files while the desktop app is open: both keep
+# the progress in memory and the last one to save wins.
+import argparse, sys, threading, time
+
+from focus_engine import TimerEngine, SessionStats, SessionStore, now_iso, catch_up
+from focus_storage import open_storage, load_achievements, ExportJob
+
+# key -> (type, allowed values or (min, max)), the same ranges as the settings window
+SETTINGS = {
+    "focus_min": (int, (5, 120)),
+    "break_min": (int, (0, 60)),
+    "font_size": (int, (10, 28)),
+    "theme": (str, ("Soft", "Playful")),
+    "locale": (str, ("en", "ko", "cn")),
+    "muted": (bool, None),
+    "dyslexia_font": (bool, None),
+}
+SETTING_DEFAULTS = {"focus_min": 25, "break_min": 5, "font_size": 14, "theme": "Soft", "locale": "en",
+                    "muted": False, "dyslexia_font": False}
+BAR_WIDTH = 30
+REDRAW_MS = 1000 # the countdown only shows whole seconds
+
+def parse_setting(key, text):
+    # "focus_min", "50" -> 50; raises ValueError with a message fit for the user
+    if key not in SETTINGS:
+        raise ValueError(f"unknown setting {key!r} (one of {', '.join(SETTINGS)})")
+    kind, allowed = SETTINGS[key]
+    if kind is bool:
+        if text.lower() not in ("true", "false", "1", "0", "yes", "no", "on", "off"):
+            raise ValueError(f"{key} must be true or false")
+        return text.lower() in ("true", "1", "yes", "on")
+    value = kind(text)
+    if kind is int and not allowed[0] <= value <= allowed[1]:
+        raise ValueError(f"{key} must be between {allowed[0]} and {allowed[1]}")
+    if kind is str and value not in allowed:
+        raise ValueError(f"{key} must be one of {', '.join(allowed)}")
+    return value
+
+def make_engine(state, achievements, session_log=None):
+    # a TimerEngine with the saved progress, as ProductivityTimerApp builds it
+    return TimerEngine(state.get("focus_min", 25), state.get("break_min", 5),
+                       xp=state.get("xp", 0), level=state.get("level", 1),
+                       streak=state.get("streak", 0), badges=state.get("badges", []),
+                       achievements=achievements, achievement_state=state.get("achievements"),
+                       session_log=SessionStore() if session_log is None else session_log,
+                       stats=SessionStats(state.get("stats")))
+
+def load_progress(storage, state, achievements):
+    # engine over the full history, with the stats and achievements caught up
+    engine = make_engine(state, achievements, storage.load_history())
+    engine.stats.sync(engine.session_log)
+    engine.reevaluate_achievements()
+    return engine
+
+def save_progress(storage, state, engine):
+    state.update(xp=engine.xp, level=engine.level, streak=engine.streak, badges=list(engine.badges),
+                 achievements=engine.tracker.to_dict(), stats=engine.stats.to_dict())
+    storage.save_sessions(engine.session_log)
+    return storage.save_state(state)
+
+def format_clock(seconds):
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+class TerminalTimer:
+    # Runs the engine in the foreground. The history loads on a thread while the
+    # first session is already counting down, and is merged in before the first save
+    # (like the desktop app's deferred history load).
+    def __init__(self, storage, state, achievements, cycles=1, out=sys.stdout):
+        self.storage = storage
+        self.state = state
+        self.cycles = cycles # focus+break rounds to run, 0 = until Ctrl+C
+        self.out = out
+        self.tty = out.isatty()
+        self.engine = make_engine(state, achievements)
+        self.engine.add_listener(self.on_engine_event)
+        self.rounds = 0
+        self.history_loaded = False
+        self._history = {}
+        self._history_thread = threading.Thread(target=self._load_history, name="history-loader", daemon=True)
+        self._history_thread.start()
+        self.audio = None
+        if not state.get("muted", False):
+            from focus_audio import AudioPlayer
+            self.audio = AudioPlayer()
+
+    def _load_history(self):
+        # on the loader thread: the history, and the saved stats/achievements caught up with it
+        log = self.storage.load_history()
+        progress = catch_up(log, self.engine.achievements, self.state.get("stats"), self.state.get("achievements"))
+        self._history.update(log=log, progress=progress)
+
+    def finish_history_load(self):
+        if self.history_loaded:
+            return
+        self._history_thread.join()
+        new_badges = self.engine.adopt_history(self._history["log"], *self._history["progress"])
+        self.history_loaded = True
+        for aid in new_badges:
+            self.say(f"Badge earned: {self.engine.achievements.rules[aid]['name']}")
+
+    def save(self):
+        self.finish_history_load()
+        save_progress(self.storage, self.state, self.engine)
+
+    def say(self, text):
+        # a line of its own, above the countdown
+        self.out.write(("\r\033[K" if self.tty else "") + text + "\n")
+        self.out.flush()
+
+    def draw(self):
+        e = self.engine
+        remaining = e.clock.remaining()
+        total = e.session_length() or 1
+        filled = int(BAR_WIDTH * (1 - remaining / total))
+        self.out.write(f"\r\033[K{'Focus' if e.is_focus else 'Break'}  {format_clock(remaining)}  "
+                       f"[{'#' * filled}{'.' * (BAR_WIDTH - filled)}]  XP {e.xp}  Level {e.level}  Streak {e.streak}")
+        self.out.flush()
+
+    def on_engine_event(self, event, **data):
+        if event == "session_complete":
+            entry = data["entry"]
+            if entry["type"] == "focus":
+                self.say(f"{now_iso()[11:16]}  Focus session done (+{entry['xp']} XP)")
+            else:
+                self.say(f"{now_iso()[11:16]}  Break over")
+            if self.audio is not None and not self.audio.play("focus_end" if entry["type"] == "focus" else "break_end"):
+                self.out.write("\a") # no audio player here, the terminal bell will do
+            if entry["type"] == "break" or self.engine.break_min <= 0:
+                self.rounds += 1
+            self.save()
+        elif event == "level_up":
+            self.say(f"Level up! You are now level {data['level']}")
+        elif event == "badge":
+            self.say(f"Badge earned: {data['name']}")
+        elif event == "session_aborted":
+            self.say(f"Stopped after {data['entry']['minutes']} min (logged as unfinished)")
+
+    def run(self):
+        e = self.engine
+        self.say(f"Focus {e.focus_min} min, break {e.break_min} min. Ctrl+C stops.")
+        e.start_timer()
+        try:
+            while not self.cycles or self.rounds < self.cycles:
+                wait = e.tick()
+                if wait is None or self.cycles and self.rounds >= self.cycles:
+                    break
+                if self.tty:
+                    self.draw()
+                # sleep to the next whole second of the countdown (or the session end)
+                time.sleep(min(wait, REDRAW_MS) / 1000)
+            e.pause_timer() # the next session has started already; leave it unlogged
+        except KeyboardInterrupt:
+            e.abort_session()
+        finally:
+            self.save()
+            self.storage.compact(self.engine.session_log, force=False)
+            if self.audio is not None:
+                self.audio.close()
+            if self.tty:
+                self.out.write("\r\033[K")
+        self.say(f"XP {e.xp}  Level {e.level}  Streak {e.streak}  Badges {len(e.badges)}")
+
+def cmd_run(args, storage):
+    state = storage.load_settings()
+    if args.focus is not None:
+        state["focus_min"] = parse_setting("focus_min", str(args.focus))
+    if args.break_min is not None:
+        state["break_min"] = parse_setting("break_min", str(args.break_min))
+    TerminalTimer(storage, state, load_achievements(), args.cycles).run()
+
+def cmd_stats(args, storage):
+    # the stats window, as text
+    state = storage.load_settings()
+    engine = load_progress(storage, state, load_achievements())
+    stats = engine.stats
+    today = now_iso()[:10]
+    rows = [
+        ("XP", engine.xp), ("Level", engine.level), ("Streak", engine.streak),
+        ("Badges", f"{len(engine.badges)} / {len(engine.achievements.rules)}"),
+        ("Today", f"{stats.focus_minutes_on(today)} min"),
+        ("This week", f"{stats.focus_minutes_in_week(today)} min"),
+        ("This month", f"{stats.focus_minutes_in_month(today)} min"),
+        ("Completed", stats.completed),
+        ("Aborted", stats.aborted),
+        ("Completion rate", f"{stats.completion_rate():.0%}"),
+        ("Longest streak", stats.longest_run),
+        ("Longest daily streak", stats.longest_day_run),
+    ]
+    for name, value in rows:
+        print(f"{name:22s}{value:>12}")
+    print("\nLast 7 days")
+    days = stats.last_days(7, today)
+    most = max([m for _, m in days] + [1])
+    for day, minutes in days:
+        print(f"  {day[5:]}  {'#' * round(BAR_WIDTH * minutes / most):{BAR_WIDTH}s} {minutes:>5}")
+    if engine.badges:
+        names = [engine.achievements.rules[aid]["name"] for aid in engine.achievements.order if aid in engine.badges]
+        print("\nBadges: " + ", ".join(names))
+
+def cmd_export(args, storage):
+    try:
+        job = ExportJob(storage.load_history(), args.file, args.start, args.end, args.types)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    job.start()
+    try:
+        while not job.finished:
+            if sys.stderr.isatty():
+                sys.stderr.write(f"\rExporting... {job.done:,} / {job.total:,}")
+                sys.stderr.flush()
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        job.cancel()
+        job.thread.join()
+    if sys.stderr.isatty():
+        sys.stderr.write("\r\033[K")
+    if job.error is not None:
+        print(f"Export failed: {job.error}", file=sys.stderr)
+        return 1
+    if job.cancelled:
+        print("Export cancelled", file=sys.stderr)
+        return 1
+    print(f"Exported {job.written:,} sessions to {args.file}")
+
+def cmd_settings(args, storage):
+    state = storage.load_settings()
+    if not args.changes:
+        for key in SETTINGS:
+            print(f"{key:15s}{state.get(key, SETTING_DEFAULTS[key])}")
+        return
+    changes = {}
+    for change in args.changes:
+        key, sep, text = change.partition("=")
+        if not sep:
+            print(f"expected key=value, got {change!r}", file=sys.stderr)
+            return 2
+        try:
+            changes[key] = parse_setting(key, text)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    state.update(changes)
+    if not storage.save_state(state):
+        print("Could not save the settings", file=sys.stderr)
+        return 1
+    for key, value in changes.items():
+        print(f"{key} = {value}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Focus+ productivity timer in the terminal")
+    parser.add_argument("--storage", choices=["json", "sqlite"], help="where settings and history are kept (as the desktop app)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="count down focus/break sessions")
+    run.add_argument("--focus", type=int, help="focus minutes (saved as the new default)")
+    run.add_argument("--break", dest="break_min", type=int, help="break minutes (saved as the new default)")
+    run.add_argument("--cycles", type=int, default=1, help="focus+break rounds, 0 = until Ctrl+C")
+    commands.add_parser("stats", help="XP, level, badges and focus time")
+    export = commands.add_parser("export", help="write the session history to a CSV file (.csv.gz compresses)")
+    export.add_argument("file")
+    export.add_argument("--from", dest="start", metavar="YYYY-MM-DD")
+    export.add_argument("--to", dest="end", metavar="YYYY-MM-DD")
+    export.add_argument("--type", dest="types", action="append", choices=["focus", "break"], help="only these sessions (repeatable)")
+    settings = commands.add_parser("settings", help="show the settings, or change them with key=value")
+    settings.add_argument("changes", nargs="*", metavar="key=value")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.storage)
+    try:
+        if args.command == "run":
+            try:
+                return cmd_run(args, storage)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 2
+        return {"stats": cmd_stats, "export": cmd_export, "settings": cmd_settings}[args.command](args, storage)
+    finally:
+        storage.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
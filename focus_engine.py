@@ -0,0 +1,811 @@
+# Focus+ timer core: the focus/break state machine with XP, levels, streaks and
+# badges. Nothing in here touches Tk, so it can run headless (tests, simulation,
+# services) with a real or a virtual clock.
+import bisect, calendar, datetime, hashlib, json, math, sys, time
+from array import array
+from collections.abc import Mapping
+
+# more time asleep than this between two ticks is taken off the session (less is
+# clock jitter)
+SUSPEND_GAP = 2.0
+
+# the built-in rules (see Achievements for loading others)
+BADGE_THRESHOLDS = {3: "Bronze", 5: "Silver", 10: "Gold"}
+XP_PER_LEVEL = 50
+
+def now_iso(t=None):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+
+def _suspend_counter():
+    # seconds the machine has been suspended since boot: a clock that keeps counting
+    # while asleep minus one that stands still, like time.monotonic(). Windows'
+    # time.monotonic() counts suspended time already, so there it stays 0. The wall
+    # clock is no evidence: NTP or the user can move it while the machine is awake.
+    if hasattr(time, "CLOCK_BOOTTIME"): # Linux
+        counting, still = time.CLOCK_BOOTTIME, time.CLOCK_MONOTONIC
+    elif sys.platform == "darwin" and hasattr(time, "CLOCK_UPTIME_RAW"):
+        counting, still = time.CLOCK_MONOTONIC, time.CLOCK_UPTIME_RAW
+    else:
+        return lambda: 0.0
+    return lambda: time.clock_gettime(counting) - time.clock_gettime(still)
+
+time_suspended = _suspend_counter()
+
+class VirtualClock:
+    # Stand-in for time.monotonic()/time.time() that only moves when told to
+    def __init__(self, start=0.0, wall_start=None):
+        self.now = float(start)
+        self.wall_offset = (time.time() if wall_start is None else wall_start) - self.now
+        self.asleep = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now + self.wall_offset
+
+    def suspended(self):
+        return self.asleep
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def suspend(self, seconds):
+        # the machine sleeps: the wall clock moves on, monotonic() stands still
+        self.asleep += seconds
+        self.wall_offset += seconds
+
+class SessionClock:
+    # Anchors the running session to a time.monotonic() deadline. The seconds left are
+    # always derived from the deadline, so late wakeups (dialogs, slow saves, beeps)
+    # never add up to drift.
+    def __init__(self, clock=time.monotonic, suspended=time_suspended):
+        self.clock = clock
+        self.suspended = suspended
+        self.deadline = None # set while running
+        self.left = 0.0 # seconds left while stopped
+        self._last = None # suspended() seen at the last reconcile()
+
+    def running(self):
+        return self.deadline is not None
+
+    def set(self, seconds):
+        self.left = float(seconds)
+        if self.deadline is not None:
+            self.deadline = self.clock() + self.left
+
+    def start(self):
+        if self.deadline is None:
+            self.deadline = self.clock() + self.left
+            self._last = self.suspended()
+
+    def stop(self):
+        if self.deadline is not None:
+            self.left = max(0.0, self.deadline - self.clock())
+            self.deadline = None
+
+    def roll_over(self, seconds):
+        # start the next session where the previous one should have ended, unless we
+        # are so late that the next one would already be over
+        now = self.clock()
+        if self.deadline is not None and now - self.deadline < seconds:
+            self.deadline += seconds
+        else:
+            self.deadline = now + seconds
+            self._last = self.suspended()
+        self.left = float(seconds)
+
+    def reconcile(self):
+        # time.monotonic() can stand still while the machine sleeps; count that time as elapsed
+        if self.deadline is None:
+            return
+        asleep = self.suspended()
+        if self._last is not None and asleep - self._last > SUSPEND_GAP:
+            self.deadline -= asleep - self._last
+        self._last = asleep
+
+    def seconds_left(self):
+        if self.deadline is None:
+            return self.left
+        return max(0.0, self.deadline - self.clock())
+
+    def remaining(self):
+        # whole seconds shown on the clock face (25:00 until a full second has passed)
+        return math.ceil(self.seconds_left())
+
+    def next_wakeup_ms(self):
+        # time until the shown second changes, aimed just past the boundary
+        left = self.seconds_left()
+        if left <= 0:
+            return 0
+        return int((left - (math.ceil(left) - 1)) * 1000) + 1
+
+class TimerEngine:
+    # The timer state machine. The owner calls tick() whenever the returned number of
+    # milliseconds has passed; everything that happens is reported to the listeners
+    # as listener(event, **data):
+    #   "started", "paused", "reset"
+    #   "tick"              remaining=<seconds>
+    #   "session_aborted"   entry=<log entry>
+    #   "session_complete"  entry=<log entry>  (the next session is already running)
+    #   "level_up"          level=<new level>
+    #   "badge"             id=<achievement id>, name=<badge name>, threshold=<value reached>
+    def __init__(self, focus_min=25, break_min=5, xp=0, level=1, streak=0, badges=(), session_log=None,
+                 clock=time.monotonic, wall=time.time, achievements=None, achievement_state=None, stats=None,
+                 suspended=time_suspended):
+        self.focus_min = focus_min
+        self.break_min = break_min
+        self.xp = xp
+        self.level = level
+        self.streak = streak
+        self.achievements = Achievements() if achievements is None else achievements
+        self.tracker = AchievementTracker(self.achievements, achievement_state)
+        self.badges = self.achievements.migrate(badges)
+        self.session_log = SessionStore() if session_log is None else session_log
+        self.stats = SessionStats() if stats is None else stats
+        self.wall = wall
+        self.clock = SessionClock(clock, suspended)
+        self.is_focus = True
+        self.is_running = False
+        self.remaining = focus_min * 60
+        self.clock.set(self.remaining)
+        self.listeners = []
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def emit(self, event, **data):
+        for fn in self.listeners:
+            fn(event, **data)
+
+    def session_length(self):
+        return (self.focus_min if self.is_focus else self.break_min) * 60
+
+    def set_remaining(self, seconds):
+        self.remaining = seconds
+        self.clock.set(seconds)
+        if self.is_running:
+            self.clock.start()
+        else:
+            self.clock.stop()
+
+    def start_timer(self):
+        # returns the milliseconds until the first tick, or None if already running
+        if self.is_running:
+            return None
+        self.is_running = True
+        self.clock.start()
+        self.emit("started")
+        return 0
+
+    def pause_timer(self):
+        self.is_running = False
+        self.clock.stop()
+        self.remaining = self.clock.remaining()
+        self.emit("paused")
+
+    def abort_session(self):
+        # log the running session as unsuccessful (reset / closing the app)
+        if not self.is_running:
+            return None
+        self.remaining = self.clock.remaining()
+        elapsed_seconds = self.session_length() - self.remaining
+        minutes_elapsed = max(0, elapsed_seconds // 60)
+        typ = "focus" if self.is_focus else "break"
+        entry = {"time": now_iso(self.wall()), "type": typ, "minutes": minutes_elapsed, "xp": 0, "success": False}
+        self.record(entry)
+        self.emit("session_aborted", entry=entry)
+        return entry
+
+    def record(self, entry):
+        self.session_log.append(entry)
+        self.stats.add(entry)
+        self.tracker.add(entry)
+
+    def reset_timer(self):
+        self.abort_session()
+        self.is_running = False
+        self.is_focus = True
+        self.set_remaining(self.focus_min * 60)
+        self.emit("reset")
+
+    def tick(self):
+        # returns the milliseconds until the next tick, or None when stopped
+        if not self.is_running:
+            return None
+        # The time left comes from the session deadline, not from counting ticks
+        self.clock.reconcile()
+        self.remaining = self.clock.remaining()
+        if self.remaining <= 0:
+            self.complete_session(natural=True)
+        else:
+            self.emit("tick", remaining=self.remaining)
+        return self.clock.next_wakeup_ms()
+
+    def complete_session(self, natural=True):
+        entry = None
+        if natural:
+            typ = "focus" if self.is_focus else "break"
+            minutes = self.focus_min if self.is_focus else self.break_min
+            xp_gained = minutes if self.is_focus else 0
+            if self.is_focus:
+                self.xp += xp_gained
+                self._level_up_if_needed()
+                self.streak += 1
+            entry = {"time": now_iso(self.wall()), "type": typ, "minutes": minutes, "xp": xp_gained, "success": True}
+            self.record(entry)
+            if self.is_focus:
+                self.check_badges()
+
+        # Next session logic
+        if self.break_min <= 0:
+            self.is_focus = True
+        else:
+            self.is_focus = not self.is_focus
+        self.remaining = self.session_length()
+        # the next session starts at the old deadline, not whenever this code got to run
+        self.clock.roll_over(self.remaining)
+
+        # Auto-start next
+        self.is_running = True
+        self.emit("session_complete", entry=entry)
+
+    def _level_up_if_needed(self):
+        new_level = self.achievements.levels.level(self.xp)
+        if new_level > self.level:
+            self.level = new_level
+            self.emit("level_up", level=new_level)
+
+    def check_badges(self):
+        # the tracker already knows which thresholds the last session crossed
+        for aid in self.tracker.take_new():
+            if aid not in self.badges:
+                self.badges.add(aid)
+                rule = self.achievements.rules[aid]
+                self.emit("badge", id=aid, name=rule["name"], threshold=rule["threshold"])
+
+    def reevaluate_achievements(self, force=False):
+        # one pass over the whole log when the rules changed since the achievement
+        # progress was saved (or it was never saved). Badges are never taken away,
+        # apart from ones the rules no longer have. Returns the newly earned ids.
+        if not force and self.tracker.rules == self.achievements.fingerprint:
+            return []
+        return self._award(self.tracker.rebuild(self.session_log))
+
+    def _award(self, earned):
+        new = [aid for aid in self.achievements.order if aid in earned and aid not in self.badges]
+        self.badges = {aid for aid in self.badges if aid in self.achievements.rules} | earned
+        self.level = self.achievements.levels.level(self.xp)
+        return new
+
+    def adopt_history(self, session_log, stats, tracker=None):
+        # swap in a history loaded and caught up on another thread (see catch_up());
+        # the sessions recorded here in the meantime are appended to it and counted.
+        # Returns the newly earned badge ids, as reevaluate_achievements().
+        newer = self.session_log
+        session_log.extend(newer)
+        for entry in newer:
+            stats.add(entry)
+        self.session_log, self.stats = session_log, stats
+        if tracker is None: # the saved progress matched the rules; self.tracker is current
+            return []
+        for entry in newer:
+            tracker.add(entry)
+        tracker.take_new()
+        self.tracker = tracker
+        return self._award(self.achievements.earned(tracker.values()))
+
+def catch_up(session_log, achievements, stats_data=None, achievement_state=None):
+    # The part of loading that takes time in proportion to the history, for a worker
+    # thread: the saved stats and achievement progress (as in the state file) brought
+    # in line with session_log. Returns (stats, tracker), tracker None when the saved
+    # progress still matches the rules; TimerEngine.adopt_history() takes both.
+    stats = SessionStats(stats_data)
+    stats.sync(session_log)
+    tracker = AchievementTracker(achievements, achievement_state)
+    if tracker.rules == achievements.fingerprint:
+        return stats, None
+    tracker.rebuild(session_log)
+    return stats, tracker
+
+def progress_from_log(session_log, achievements=None):
+    # xp, level, streak and badges worked out from the history alone, using the same
+    # rules as TimerEngine.complete_session() (after merging logs from other machines)
+    achievements = Achievements() if achievements is None else achievements
+    if isinstance(session_log, SessionStore):
+        xp = sum(session_log.xp)
+    else:
+        xp = sum(int(entry.get("xp", 0) or 0) for entry in session_log)
+    tracker = AchievementTracker(achievements)
+    earned = tracker.rebuild(session_log)
+    return {"xp": xp, "level": achievements.levels.level(xp), "streak": tracker.streak,
+            "badges": [aid for aid in achievements.order if aid in earned], "achievements": tracker.to_dict()}
+
+def simulate(engine, vclock, sessions):
+    # Runs `sessions` back-to-back sessions on a VirtualClock by jumping straight to
+    # each deadline. Returns the number of sessions completed.
+    if not engine.is_running:
+        engine.start_timer()
+    done = 0
+    while done < sessions:
+        vclock.advance(engine.clock.seconds_left())
+        before = len(engine.session_log)
+        engine.tick()
+        done += len(engine.session_log) - before
+    return done
+
+def make_simulation(focus_min=25, break_min=5, **kw):
+    vclock = VirtualClock()
+    engine = TimerEngine(focus_min, break_min, clock=vclock.monotonic, wall=vclock.time, suspended=vclock.suspended, **kw)
+    return engine, vclock
+
+# Compact session history
+SESSION_KEYS = ("time", "type", "minutes", "xp", "success")
+SESSION_TYPES = ["focus", "break"] # index is the type code; unknown types get appended
+MAX_SESSION_TYPES = 128 # a SessionStore packs type code * 2 + success into a byte
+
+def parse_time(s):
+    # "YYYY-MM-DD HH:MM:SS" -> whole seconds, read as if it were UTC so the local
+    # wall-clock text comes back exactly; None if it doesn't look like that
+    if not isinstance(s, str) or len(s) != 19 or s[4] != "-" or s[10] != " ":
+        return None
+    try:
+        return calendar.timegm((int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]), 0, 0, 0))
+    except ValueError:
+        return None
+
+_day_text = {}
+
+def format_time(t):
+    day, secs = divmod(t, 86400)
+    text = _day_text.get(day)
+    if text is None:
+        text = _day_text[day] = time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+    return f"{text} {secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+class SessionRow(Mapping):
+    # Read-only dict-like view of one entry in a SessionStore
+    __slots__ = ("_store", "_i")
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._store.field(self._i, key)
+
+    def __iter__(self):
+        return iter(SESSION_KEYS)
+
+    def __len__(self):
+        return len(SESSION_KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class SessionStore:
+    # The session log packed into typed arrays: about 17 bytes per session instead
+    # of a dict plus a timestamp string. Behaves like a list of session dicts:
+    # append() takes a dict, indexing and iteration give SessionRow views.
+    def __init__(self, entries=()):
+        self.times = array("q") # seconds, see parse_time()
+        self.codes = array("B") # type code * 2 + success
+        self.minutes = array("i")
+        self.xp = array("i")
+        self.odd_times = {} # index -> original "time" value when it didn't parse
+        self.extend(entries)
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, entry):
+        typ = entry.get("type", "")
+        try:
+            code = SESSION_TYPES.index(typ)
+        except ValueError:
+            if len(SESSION_TYPES) >= MAX_SESSION_TYPES:
+                raise ValueError(f"too many session types (at most {MAX_SESSION_TYPES}), can't add {typ!r}") from None
+            SESSION_TYPES.append(typ)
+            code = len(SESSION_TYPES) - 1
+        t = entry.get("time", "")
+        secs = parse_time(t)
+        if secs is None:
+            self.odd_times[len(self.times)] = t
+            secs = 0
+        self.times.append(secs)
+        self.codes.append(code * 2 + (1 if entry.get("success", False) else 0))
+        self.minutes.append(int(entry.get("minutes", 0) or 0))
+        self.xp.append(int(entry.get("xp", 0) or 0))
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def append_fields(self, secs, type_code, minutes, xp, success):
+        # append() for a session that is already split into numbers (bulk import)
+        self.times.append(secs)
+        self.codes.append(type_code * 2 + (1 if success else 0))
+        self.minutes.append(minutes)
+        self.xp.append(xp)
+
+    def clear(self):
+        for arr in (self.times, self.codes, self.minutes, self.xp):
+            del arr[:]
+        self.odd_times.clear()
+
+    def field(self, i, key):
+        if key == "time":
+            if i in self.odd_times:
+                return self.odd_times[i]
+            return format_time(self.times[i])
+        if key == "type":
+            return SESSION_TYPES[self.codes[i] >> 1]
+        if key == "minutes":
+            return self.minutes[i]
+        if key == "xp":
+            return self.xp[i]
+        if key == "success":
+            return bool(self.codes[i] & 1)
+        raise KeyError(key)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [SessionRow(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("session index out of range")
+        return SessionRow(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield SessionRow(self, i)
+
+    def dicts(self):
+        # plain dicts, e.g. for json
+        for i in range(len(self)):
+            yield {k: self.field(i, k) for k in SESSION_KEYS}
+
+
+# Statistics
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_week_keys = {}
+
+def week_key(day_number):
+    # "2024-W05" (ISO week) for a day counted from 1970-01-01
+    key = _week_keys.get(day_number)
+    if key is None:
+        year, week, _ = datetime.date.fromordinal(EPOCH_ORDINAL + day_number).isocalendar()
+        key = _week_keys[day_number] = f"{year}-W{week:02d}"
+    return key
+
+# SessionStats.sync() rebuilds instead of catching up once over 1/8 of the log is new
+SYNC_REBUILD_FRACTION = 8
+
+class SessionStats:
+    # Running totals over the session log, updated one entry at a time so the
+    # dashboard never has to rescan the history:
+    #   daily/weekly/monthly  focus minutes of completed focus sessions
+    #   completed/aborted     sessions with success True/False
+    #   run/longest_run       completed focus sessions in a row (an aborted focus ends a run)
+    #   day_run/longest_day_run  days in a row with at least one completed focus session
+    FIELDS = ("count", "completed", "aborted", "run", "longest_run", "last_day", "day_run", "longest_day_run")
+
+    def __init__(self, data=None):
+        data = data or {}
+        for name in self.FIELDS:
+            setattr(self, name, data.get(name, -1 if name == "last_day" else 0))
+        self.daily = dict(data.get("daily", {}))
+        self.weekly = dict(data.get("weekly", {}))
+        self.monthly = dict(data.get("monthly", {}))
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        # copies, since the state writer serializes them on its own thread
+        data.update(daily=dict(self.daily), weekly=dict(self.weekly), monthly=dict(self.monthly))
+        return data
+
+    def add(self, entry):
+        self.count += 1
+        success = bool(entry.get("success", False))
+        if success:
+            self.completed += 1
+        else:
+            self.aborted += 1
+        if entry.get("type") != "focus":
+            return
+        if not success:
+            self.run = 0
+            return
+        self.run += 1
+        self.longest_run = max(self.longest_run, self.run)
+        secs = parse_time(entry.get("time"))
+        if secs is not None:
+            self._add_focus_day(secs // 86400, int(entry.get("minutes", 0) or 0))
+
+    def _add_focus_day(self, day_number, minutes):
+        day = format_time(day_number * 86400)[:10]
+        self.daily[day] = self.daily.get(day, 0) + minutes
+        week = week_key(day_number)
+        self.weekly[week] = self.weekly.get(week, 0) + minutes
+        self.monthly[day[:7]] = self.monthly.get(day[:7], 0) + minutes
+        if day_number != self.last_day:
+            self.day_run = self.day_run + 1 if day_number == self.last_day + 1 else 1
+            self.longest_day_run = max(self.longest_day_run, self.day_run)
+            self.last_day = day_number
+
+    def sync(self, session_log):
+        # catch up with entries that were saved without the stats (or start over if
+        # the log was replaced, or when most of it is missing: a batch rebuild beats
+        # add() one entry at a time); returns True if anything changed
+        n = len(session_log)
+        if self.count == n:
+            return False
+        if self.count == 0 or self.count > n or (n - self.count) * SYNC_REBUILD_FRACTION > n:
+            self.rebuild(session_log)
+        else:
+            for entry in session_log[self.count:]:
+                self.add(entry)
+        return True
+
+    def rebuild(self, session_log):
+        # one batch pass over the whole log (after an import or reset)
+        self.__init__()
+        if not isinstance(session_log, SessionStore) and hasattr(session_log, "session_store"):
+            session_log = session_log.session_store() # SQLite: packed in one query
+        if isinstance(session_log, SessionStore) and not session_log.odd_times:
+            self._rebuild_arrays(session_log)
+        else:
+            for entry in session_log:
+                self.add(entry)
+
+    def _rebuild_arrays(self, store):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        focus_done = SESSION_TYPES.index("focus") * 2 + 1
+        focus_failed = focus_done - 1
+        n = len(store)
+        if np is not None:
+            times = np.frombuffer(store.times, dtype=np.int64)
+            codes = np.frombuffer(store.codes, dtype=np.uint8)
+            minutes = np.frombuffer(store.minutes, dtype=np.int32)
+            self.completed = int((codes & 1).sum())
+            done = codes == focus_done
+            days, inverse = np.unique(times[done] // 86400, return_inverse=True)
+            totals = np.bincount(inverse, weights=minutes[done], minlength=len(days))
+            per_day = zip(days.tolist(), totals.astype(np.int64).tolist())
+            # runs of completed focus sessions, ignoring breaks
+            focus = codes[(codes == focus_done) | (codes == focus_failed)] & 1
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], focus, [0]))))
+            runs = edges[1::2] - edges[::2]
+            self.longest_run = int(runs.max()) if len(runs) else 0
+            self.run = int(runs[-1]) if len(runs) and focus[-1] else 0
+        else:
+            sums = {}
+            run = 0
+            for t, code, m in zip(store.times, store.codes, store.minutes):
+                if code & 1:
+                    self.completed += 1
+                if code == focus_done:
+                    d = t // 86400
+                    sums[d] = sums.get(d, 0) + m
+                    run += 1
+                    if run > self.longest_run:
+                        self.longest_run = run
+                elif code == focus_failed:
+                    run = 0
+            self.run = run
+            per_day = sorted(sums.items())
+        self.count = n
+        self.aborted = n - self.completed
+        for day_number, minutes in per_day:
+            self._add_focus_day(day_number, minutes)
+
+    # dashboard lookups, all O(1) apart from last_days(n)
+    def focus_minutes_on(self, day):
+        return self.daily.get(day, 0)
+
+    def focus_minutes_in_week(self, day):
+        return self.weekly.get(week_key(parse_time(day + " 00:00:00") // 86400), 0)
+
+    def focus_minutes_in_month(self, day):
+        return self.monthly.get(day[:7], 0)
+
+    def last_days(self, n, today):
+        # [(YYYY-MM-DD, minutes)] for the n days up to and including today
+        end = parse_time(today + " 00:00:00") // 86400
+        days = [format_time(d * 86400)[:10] for d in range(end - n + 1, end + 1)]
+        return [(d, self.daily.get(d, 0)) for d in days]
+
+    def completion_rate(self):
+        return self.completed / self.count if self.count else 0.0
+
+
+# Achievements and levels
+ACHIEVEMENT_METRICS = ("streak", "focus_minutes", "sessions_per_day", "sessions_per_week")
+DEFAULT_RULES = {
+    "levels": {"xp_per_level": XP_PER_LEVEL},
+    "achievements": [{"id": f"streak-{t}", "name": name, "metric": "streak", "threshold": t}
+                     for t, name in sorted(BADGE_THRESHOLDS.items())],
+}
+SHOWCASE_SLOTS = 6 # badges shown in the main window when the rules don't pick any
+
+class LevelCurve:
+    # "levels" in the rules, one of
+    #   {"xp_per_level": 50}                            level = 1 + xp // 50
+    #   {"xp": [50, 120, 210]}                          total XP needed for level 2, 3, 4...
+    #   {"base": 50, "growth": 1.2, "max_level": 100}   each level needs `growth` times the XP of the last
+    def __init__(self, spec=None):
+        spec = spec or {}
+        self.step = None
+        self.thresholds = []
+        if "xp" in spec:
+            self.thresholds = sorted(int(x) for x in spec["xp"])
+        elif "base" in spec:
+            need, total = float(spec["base"]), 0.0
+            for _ in range(int(spec.get("max_level", 100)) - 1):
+                total += need
+                self.thresholds.append(int(total))
+                need *= float(spec.get("growth", 1.0))
+        else:
+            self.step = int(spec.get("xp_per_level", XP_PER_LEVEL))
+            if self.step <= 0:
+                raise ValueError("xp_per_level must be positive")
+
+    def level(self, xp):
+        if self.step is not None:
+            return 1 + xp // self.step
+        return 1 + bisect.bisect_right(self.thresholds, xp)
+
+class Achievements:
+    # Achievement rules, compiled once: for every metric a sorted array of thresholds
+    # with the achievement ids in the same order, so what a new value unlocks is a
+    # bisect away. Rules look like DEFAULT_RULES; an achievement is
+    #   {"id": "minutes-1000", "name": "Deep Diver", "metric": "focus_minutes", "threshold": 1000, "show": true}
+    # where metric is one of ACHIEVEMENT_METRICS (id defaults to "<metric>-<threshold>",
+    # "show" puts it in the main window).
+    def __init__(self, rules=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        self.levels = LevelCurve(rules.get("levels"))
+        self.rules = {} # id -> {"id", "name", "metric", "threshold", "show"}
+        self.order = [] # ids in the order of the rules
+        per_metric = {m: [] for m in ACHIEVEMENT_METRICS}
+        for spec in rules.get("achievements", []):
+            metric = spec.get("metric", "streak")
+            if metric not in per_metric:
+                raise ValueError(f"unknown achievement metric {metric!r}")
+            threshold = int(spec["threshold"])
+            aid = str(spec.get("id") or f"{metric}-{threshold}")
+            if aid in self.rules:
+                raise ValueError(f"duplicate achievement id {aid!r}")
+            self.rules[aid] = {"id": aid, "name": str(spec.get("name", aid)), "metric": metric,
+                               "threshold": threshold, "show": bool(spec.get("show", False))}
+            self.order.append(aid)
+            per_metric[metric].append((threshold, aid))
+        self.thresholds = {}
+        self.ids = {}
+        for metric, items in per_metric.items():
+            items.sort()
+            self.thresholds[metric] = array("q", [t for t, _ in items])
+            self.ids[metric] = [aid for _, aid in items]
+
+    def crossed(self, metric, start, value):
+        # (ids from index `start` on whose threshold is <= value, index of the next one)
+        thresholds = self.thresholds[metric]
+        if start >= len(thresholds) or thresholds[start] > value:
+            return (), start
+        end = bisect.bisect_right(thresholds, value, start)
+        return self.ids[metric][start:end], end
+
+    def earned(self, values):
+        # every achievement reached by these metric values
+        return {aid for m in ACHIEVEMENT_METRICS
+                for aid in self.ids[m][:bisect.bisect_right(self.thresholds[m], values[m])]}
+
+    def migrate(self, badges):
+        # saved badges as a set of known ids; old saves stored the streak threshold
+        streak_ids = dict(zip(self.thresholds["streak"], self.ids["streak"]))
+        known = set()
+        for badge in badges:
+            aid = str(badge)
+            if aid not in self.rules and isinstance(badge, int):
+                aid = streak_ids.get(badge)
+            if aid in self.rules:
+                known.add(aid)
+        return known
+
+    def showcase(self):
+        shown = [aid for aid in self.order if self.rules[aid]["show"]]
+        return shown or self.order[:SHOWCASE_SLOTS]
+
+class AchievementTracker:
+    # The metric values achievements are judged on, updated one session at a time:
+    #   streak            completed focus sessions (as TimerEngine.streak)
+    #   focus_minutes     minutes of completed focus sessions
+    #   sessions_per_day / sessions_per_week  best day / ISO week so far
+    # next[metric] is the index of the first threshold not reached yet, so a session
+    # only compares each metric against that one threshold.
+    FIELDS = ("streak", "focus_minutes", "sessions_per_day", "sessions_per_week", "day", "day_count", "week", "week_count")
+
+    def __init__(self, achievements, data=None):
+        data = data or {}
+        self.achievements = achievements
+        self.rules = data.get("rules") # fingerprint of the rules these values were last checked against
+        for name in self.FIELDS:
+            setattr(self, name, data.get(name, {"day": -1, "week": ""}.get(name, 0)))
+        self.new = [] # crossed since the last take_new()
+        self._day_text = None # "YYYY-MM-DD" of `day`, once add() has parsed a time
+        self._seek()
+
+    def _seek(self):
+        self.next = {m: bisect.bisect_right(th, getattr(self, m)) for m, th in self.achievements.thresholds.items()}
+
+    def values(self):
+        return {m: getattr(self, m) for m in ACHIEVEMENT_METRICS}
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.FIELDS}
+        data["rules"] = self.rules
+        return data
+
+    def add(self, entry):
+        if entry.get("type") != "focus" or not entry.get("success", False):
+            return
+        t = entry.get("time")
+        if isinstance(t, str) and t[:10] == self._day_text: # same day as the last one, no need to parse
+            self._count(self.day * 86400, int(entry.get("minutes", 0) or 0))
+        else:
+            secs = parse_time(t)
+            self._day_text = t[:10] if secs is not None else None
+            self._count(secs, int(entry.get("minutes", 0) or 0))
+        thresholds = self.achievements.thresholds
+        for metric in ACHIEVEMENT_METRICS:
+            i = self.next[metric]
+            if i < len(thresholds[metric]) and thresholds[metric][i] <= getattr(self, metric):
+                ids, self.next[metric] = self.achievements.crossed(metric, i, getattr(self, metric))
+                self.new.extend(ids)
+
+    def _count(self, secs, minutes):
+        self.streak += 1
+        self.focus_minutes += minutes
+        if secs is None:
+            return
+        day = secs // 86400
+        if day != self.day:
+            self.day, self.day_count = day, 0
+            week = week_key(day)
+            if week != self.week:
+                self.week, self.week_count = week, 0
+        self.day_count += 1
+        self.week_count += 1
+        if self.day_count > self.sessions_per_day:
+            self.sessions_per_day = self.day_count
+        if self.week_count > self.sessions_per_week:
+            self.sessions_per_week = self.week_count
+
+    def take_new(self):
+        new, self.new = self.new, []
+        return new
+
+    def rebuild(self, session_log):
+        # the retroactive evaluator: one pass over the whole log, then everything the
+        # values reach is earned. Returns the set of earned ids.
+        self.__init__(self.achievements)
+        if not isinstance(session_log, SessionStore) and hasattr(session_log, "session_store"):
+            session_log = session_log.session_store() # SQLite: packed in one query
+        if isinstance(session_log, SessionStore):
+            focus_done = SESSION_TYPES.index("focus") * 2 + 1
+            odd = session_log.odd_times
+            for i, (t, code, minutes) in enumerate(zip(session_log.times, session_log.codes, session_log.minutes)):
+                if code == focus_done:
+                    self._count(None if i in odd else t, minutes)
+        else:
+            for entry in session_log:
+                if entry.get("type") == "focus" and entry.get("success", False):
+                    self._count(parse_time(entry.get("time")), int(entry.get("minutes", 0) or 0))
+        self.rules = self.achievements.fingerprint
+        self._seek()
+        return self.achievements.earned(self.values())
@@ -0,0 +1,168 @@
+# Sorted and filtered views of the session history for the history window.
+# Nothing here touches Tk, and no session is turned into a dict until it is shown:
+# a view is just an array of positions in the SessionStore.
+#
+# Every sortable column gets its order computed once, as a permutation of the
+# positions, the first time it is asked for (time order is usually the log's own
+# order and costs nothing). Filtering walks that permutation once; a date range on
+# the time order is a bisect. numpy does both when installed.
+import bisect
+from array import array
+
+from focus_engine import SessionStore, SESSION_TYPES, parse_time
+
+HISTORY_COLUMNS = ("time", "type", "minutes", "xp", "success")
+# a date range under 1/8 of the log is sorted by itself instead of building the
+# whole column's order
+SUBSET_SORT_FRACTION = 8
+
+def session_snapshot(session_log):
+    # the log as a SessionStore (SQLite keeps it on disk); sessions logged after this
+    # are not in it
+    if isinstance(session_log, SessionStore):
+        return session_log
+    return session_log.session_store()
+
+def day_bounds(start_date=None, end_date=None):
+    # "YYYY-MM-DD" dates, both inclusive -> (first second, first second after); None
+    # where open. Raises ValueError for anything else.
+    lo = hi = None
+    if start_date:
+        lo = parse_time(start_date + " 00:00:00")
+        if lo is None:
+            raise ValueError(f"not a date: {start_date!r}")
+    if end_date:
+        hi = parse_time(end_date + " 00:00:00")
+        if hi is None:
+            raise ValueError(f"not a date: {end_date!r}")
+        hi += 86400
+    return lo, hi
+
+class HistoryIndex:
+    def __init__(self, store, size=None):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        self.np = np
+        self.store = store
+        self.size = len(store) if size is None else size # rows past this (added later) are left out
+        self._orders = {}
+        if np is not None:
+            # on copies (slices): an array exporting its buffer can't be appended to,
+            # and the app keeps logging sessions while the window is open
+            n = self.size
+            self.times = np.frombuffer(store.times[:n], dtype=np.int64)
+            self.codes = np.frombuffer(store.codes[:n], dtype=np.uint8)
+            self.time_sorted = bool(n < 2 or (self.times[1:] >= self.times[:-1]).all())
+        else:
+            self.times, self.codes = store.times, store.codes
+            self.time_sorted = all(a <= b for a, b in zip(store.times[:self.size - 1], store.times[1:self.size]))
+
+    def _keys(self, column):
+        s, n = self.store, self.size
+        if self.np is not None:
+            np = self.np
+            return {"time": self.times, "type": self.codes >> 1, "success": self.codes & 1,
+                    "minutes": np.frombuffer(s.minutes[:n], dtype=np.int32),
+                    "xp": np.frombuffer(s.xp[:n], dtype=np.int32)}[column]
+        if column == "type":
+            return bytes(code >> 1 for code in s.codes[:n])
+        if column == "success":
+            return bytes(code & 1 for code in s.codes[:n])
+        if column == "time":
+            return self.times[:n]
+        return getattr(s, column)[:n]
+
+    def order(self, column):
+        # positions sorted by `column`, ties in log order; computed once per column
+        perm = self._orders.get(column)
+        if perm is None:
+            if column not in HISTORY_COLUMNS:
+                raise ValueError(f"unknown column {column!r}")
+            if column == "time" and self.time_sorted:
+                perm = range(self.size)
+            elif self.np is not None:
+                perm = self.np.argsort(self._keys(column), kind="stable")
+            else:
+                keys = self._keys(column)
+                perm = array("l", sorted(range(self.size), key=keys.__getitem__))
+            self._orders[column] = perm
+        return perm
+
+    def query(self, sort="time", descending=False, types=None, success=None, start_date=None, end_date=None):
+        # positions of the sessions that pass the filters, in display order. types is a
+        # collection of type names, success True/False (None for both), dates as in
+        # day_bounds(). The result supports len() and slicing.
+        lo, hi = day_bounds(start_date, end_date)
+        if (lo is not None or hi is not None) and self.time_sorted:
+            # the date range is one slice of the log; a small one is quicker to sort
+            # on its own than to pick out of the whole column's order
+            first = 0 if lo is None else bisect.bisect_left(self.times, lo, 0, self.size)
+            last = self.size if hi is None else bisect.bisect_left(self.times, hi, 0, self.size)
+            if sort == "time":
+                perm = range(first, last)
+            elif sort not in self._orders and (last - first) * SUBSET_SORT_FRACTION < self.size:
+                perm = self._sort_range(sort, first, last)
+            else:
+                perm = self.order(sort)
+                if first > 0 or last < self.size:
+                    perm = self._in_range(perm, first, last)
+            lo = hi = None
+        else:
+            perm = self.order(sort)
+        allowed = self._allowed_codes(types, success)
+        if self.np is not None:
+            rows = self._filter_np(perm, allowed, lo, hi)
+        else:
+            rows = self._filter(perm, allowed, lo, hi)
+        return rows[::-1] if descending else rows
+
+    def _sort_range(self, column, first, last):
+        keys = self._keys(column)
+        if self.np is not None:
+            return first + self.np.argsort(keys[first:last], kind="stable")
+        return array("l", sorted(range(first, last), key=keys.__getitem__))
+
+    def _in_range(self, perm, first, last):
+        # the positions in perm that fall in [first, last), order kept
+        if self.np is not None:
+            return perm[(perm >= first) & (perm < last)]
+        return array("l", [i for i in perm if first <= i < last])
+
+    def _allowed_codes(self, types, success):
+        # bytes table: allowed[code] is 1 when a session with that code passes, or None
+        if types is None and success is None:
+            return None
+        wanted = None if types is None else {SESSION_TYPES.index(t) for t in types if t in SESSION_TYPES}
+        return bytes(1 if (wanted is None or code >> 1 in wanted) and (success is None or bool(code & 1) == success) else 0
+                     for code in range(256))
+
+    def _filter_np(self, perm, allowed, lo, hi):
+        np = self.np
+        if allowed is None and lo is None and hi is None:
+            return perm
+        positions = np.arange(perm.start, perm.stop) if isinstance(perm, range) else perm
+        keep = np.ones(len(positions), dtype=bool)
+        if allowed is not None:
+            keep &= np.frombuffer(allowed, dtype=np.uint8)[self.codes[positions]].astype(bool)
+        times = self.times[positions] if lo is not None or hi is not None else None
+        if lo is not None:
+            keep &= times >= lo
+        if hi is not None:
+            keep &= times < hi
+        return positions[keep]
+
+    def _filter(self, perm, allowed, lo, hi):
+        if allowed is None and lo is None and hi is None:
+            return perm
+        codes, times = self.codes, self.times
+        lo = -2**63 if lo is None else lo
+        hi = 2**63 - 1 if hi is None else hi
+        if allowed is None:
+            return array("l", [i for i in perm if lo <= times[i] < hi])
+        return array("l", [i for i in perm if allowed[codes[i]] and lo <= times[i] < hi])
+
+    def row(self, i):
+        # one session, for display: (time, type, minutes, xp, success)
+        return tuple(self.store.field(int(i), key) for key in HISTORY_COLUMNS)
@@ -0,0 +1,279 @@
+# Import and merge session history from other machines. Accepts the app's own
+# files (productivity_timer_state.json, the history snapshot and the journal) and
+# CSVs written by Export (.csv or .csv.gz).
+#
+# Each file is parsed in a worker process into a "run": its sessions packed as
+# fixed-size binary records, sorted by time, in a temporary folder. The runs and
+# the local history are then merged in time order, reading each run a chunk at a
+# time. Sessions with the same time, type and minutes are the same session seen on
+# two machines and are kept once. xp, level, streak, badges and achievement progress
+# are recomputed from the merged log at the end.
+import csv, gzip, heapq, json, os, shutil, struct, tempfile, threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from focus_engine import SessionStore, SessionStats, SESSION_TYPES, MAX_SESSION_TYPES, parse_time, progress_from_log
+from focus_storage import JsonStorage
+
+# time, type code, minutes, success, xp
+RUN_RECORD = struct.Struct("<qBiBi")
+INT32_RANGE = (-2**31, 2**31 - 1) # minutes and xp
+RUN_READ_RECORDS = 4096 # per run while merging, so hundreds of files stay cheap
+RUN_SORT_RECORDS = 250000 # sessions sorted in memory at once by a worker
+IMPORT_PATTERNS = ("*.json", "*.jsonl", "*.csv", "*.csv.gz")
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, "r", newline="", encoding="utf-8")
+
+def _is_true(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+def read_sessions(path):
+    # yields session dicts from any of the supported files
+    name = path.lower()
+    if name.endswith((".csv", ".csv.gz")):
+        with _open_text(path) as f:
+            for row in csv.DictReader(f):
+                yield {"time": row.get("time", ""), "type": row.get("type", ""), "minutes": row.get("minutes") or 0,
+                       "xp": row.get("xp") or 0, "success": _is_true(row.get("success", ""))}
+    elif name.endswith(".jsonl"): # journal
+        with _open_text(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with _open_text(path) as f:
+            first = f.readline().strip()
+        if first == "[": # history snapshot, one session per line
+            yield from JsonStorage(history_file=path).read_snapshot()
+            return
+        with _open_text(path) as f:
+            data = json.load(f)
+        if isinstance(data, dict): # state file (older versions kept the log inside)
+            data = data.get("session_log", [])
+        if not isinstance(data, list):
+            raise ValueError("no session list in file")
+        yield from data
+
+def _write_records(rows, path):
+    pack = RUN_RECORD.pack
+    with open(path, "wb") as f:
+        for i in range(0, len(rows), RUN_READ_RECORDS):
+            f.write(b"".join(pack(*r) for r in rows[i:i + RUN_READ_RECORDS]))
+
+def _read_records(path):
+    size = RUN_RECORD.size
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size * RUN_READ_RECORDS)
+            if not chunk:
+                break
+            yield from RUN_RECORD.iter_unpack(chunk)
+
+def _record(entry):
+    # (secs, type code, minutes, success, xp) for a RUN_RECORD, or None if the
+    # session can't be packed into one (not an object, time doesn't parse, numbers
+    # out of range)
+    if not isinstance(entry, dict):
+        return None
+    secs = parse_time(entry.get("time"))
+    typ = entry.get("type", "")
+    if secs is None or not isinstance(typ, str):
+        return None
+    try:
+        minutes, xp = int(entry.get("minutes", 0) or 0), int(entry.get("xp", 0) or 0)
+    except (TypeError, ValueError):
+        return None
+    low, high = INT32_RANGE
+    if not (low <= minutes <= high and low <= xp <= high):
+        return None
+    try:
+        code = SESSION_TYPES.index(typ)
+    except ValueError:
+        if len(SESSION_TYPES) >= MAX_SESSION_TYPES:
+            return None
+        SESSION_TYPES.append(typ)
+        code = len(SESSION_TYPES) - 1
+    return secs, code, minutes, 1 if _is_true(entry.get("success", False)) else 0, xp
+
+def write_run(entries, path, keep=None):
+    # sort the sessions by time and write them as RUN_RECORDs; returns
+    # (path, sessions written, sessions skipped, type names by code). Sessions that
+    # don't fit a record are skipped, or appended to `keep` as they are when given
+    # (the local history's own odd rows are never dropped). At most RUN_SORT_RECORDS
+    # sessions are held at once: bigger files are sorted in pieces that are merged
+    # into the run at the end.
+    rows, pieces = [], []
+    count = skipped = 0
+    for entry in entries:
+        record = _record(entry)
+        if record is None:
+            if keep is not None:
+                keep.append(dict(entry))
+            else:
+                skipped += 1
+            continue
+        rows.append(record)
+        count += 1
+        if len(rows) >= RUN_SORT_RECORDS:
+            rows.sort()
+            pieces.append(f"{path}.{len(pieces)}")
+            _write_records(rows, pieces[-1])
+            rows = []
+    rows.sort()
+    if pieces:
+        if rows:
+            pieces.append(f"{path}.{len(pieces)}")
+            _write_records(rows, pieces[-1])
+        pack = RUN_RECORD.pack
+        with open(path, "wb") as f:
+            batch = []
+            for r in heapq.merge(*(_read_records(p) for p in pieces)):
+                batch.append(pack(*r))
+                if len(batch) >= RUN_READ_RECORDS:
+                    f.write(b"".join(batch))
+                    batch = []
+            f.write(b"".join(batch))
+        for p in pieces:
+            os.unlink(p)
+    else:
+        _write_records(rows, path)
+    return path, count, skipped, list(SESSION_TYPES)
+
+def parse_to_run(path, run_path):
+    # worker process entry point; a file that can't be read is reported, not fatal
+    try:
+        return write_run(read_sessions(path), run_path) + (None,)
+    except (OSError, ValueError, UnicodeDecodeError, csv.Error, EOFError, struct.error, OverflowError) as e:
+        return None, 0, 0, [], f"{os.path.basename(path)}: {e}"
+    except Exception as e: # whatever else a strange file trips over
+        return None, 0, 0, [], f"{os.path.basename(path)}: {type(e).__name__}: {e}"
+
+def read_run(path, types):
+    # RUN_RECORDs with the worker's type codes translated to this process's; -1 for
+    # a type past MAX_SESSION_TYPES (workers each had their own room for new types)
+    codes = []
+    for typ in types:
+        if typ not in SESSION_TYPES and len(SESSION_TYPES) < MAX_SESSION_TYPES:
+            SESSION_TYPES.append(typ)
+        codes.append(SESSION_TYPES.index(typ) if typ in SESSION_TYPES else -1)
+    for secs, code, minutes, success, xp in _read_records(path):
+        yield secs, codes[code], minutes, success, xp
+
+def merge_runs(runs, first=()):
+    # k-way merge by time into a new SessionStore, after the sessions in `first`,
+    # which are kept as they are. Within one second the sessions are keyed by (type,
+    # minutes): a duplicate keeps whichever copy succeeded / earned more xp.
+    # Returns (store, duplicates dropped, sessions skipped for their type).
+    store = SessionStore(first)
+    duplicates = skipped = 0
+    group_time = None
+    group = {}
+
+    def flush_group():
+        for (code, minutes), (success, xp) in sorted(group.items()):
+            store.append_fields(group_time, code, minutes, xp, success)
+
+    for secs, code, minutes, success, xp in heapq.merge(*(read_run(path, types) for path, types in runs)):
+        if code < 0:
+            skipped += 1
+            continue
+        if secs != group_time:
+            flush_group()
+            group.clear()
+            group_time = secs
+        key = (code, minutes)
+        seen = group.get(key)
+        if seen is None:
+            group[key] = (success, xp)
+        else:
+            duplicates += 1
+            if (success, xp) > seen:
+                group[key] = (success, xp)
+    flush_group()
+    return store, duplicates, skipped
+
+class ImportJob:
+    # Runs an import on a worker thread (which drives the process pool), like
+    # ExportJob: the caller polls done/total/finished. When it finishes without
+    # error, `result` holds the merged log, its stats, the recomputed progress and
+    # counts, and the storage already has the merged history. Sessions appended to session_log
+    # after the job started are not part of it; the caller adds them afterwards
+    # (session_log[job.local_rows:]).
+    def __init__(self, paths, storage, session_log, achievements=None, workers=None):
+        self.paths = list(paths)
+        self.storage = storage
+        self.rows = session_log
+        self.local_rows = len(session_log)
+        self.achievements = achievements
+        self.workers = workers
+        self.total = len(self.paths) # files
+        self.done = 0
+        self.finished = False
+        self.error = None
+        self.result = None
+        self._cancel = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="history-import", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _local_entries(self):
+        for i, entry in enumerate(self.rows):
+            if i >= self.local_rows:
+                break
+            yield entry
+
+    def _run(self):
+        run_dir = tempfile.mkdtemp(prefix="focus-import-")
+        try:
+            # local sessions whose time doesn't parse can't be merged by time; they go
+            # first, as a SessionStore keeps them (at time 0)
+            odd_local = []
+            local = write_run(self._local_entries(), os.path.join(run_dir, "local.run"), keep=odd_local)
+            runs = [(local[0], local[3])]
+            rows, skipped, failed = 0, 0, []
+            # spawn, not fork: the parent is a threaded Tk process
+            import multiprocessing
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(parse_to_run, path, os.path.join(run_dir, f"{i}.run")) for i, path in enumerate(self.paths)]
+                for future in as_completed(futures):
+                    path, count, bad, types, error = future.result()
+                    if error is not None:
+                        failed.append(error)
+                    else:
+                        runs.append((path, types))
+                        rows += count
+                        skipped += bad
+                    self.done += 1
+                    if self._cancel.is_set():
+                        for f in futures:
+                            f.cancel()
+                        return
+            merged, duplicates, bad = merge_runs(runs, odd_local)
+            skipped += bad
+            if self._cancel.is_set():
+                return
+            if not self.storage.replace_sessions(merged):
+                raise OSError("could not write the merged history")
+            stats = SessionStats()
+            stats.rebuild(merged)
+            self.result = {"log": merged, "stats": stats, "progress": progress_from_log(merged, self.achievements),
+                           "files": len(self.paths) - len(failed), "failed": failed, "rows": rows,
+                           "skipped": skipped, "duplicates": duplicates, "sessions": len(merged)}
+        except Exception as e:
+            self.error = e
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            self.finished = True
@@ -0,0 +1,445 @@
+# Headless Focus+ timers for a whole team: one asyncio event loop hosts a
+# TimerEngine per user, all woken by a single heap scheduler, behind a small
+# HTTP/JSON API on localhost. Each user's progress is kept in its own folder
+# (same files as the desktop app). Everyone shares the achievement rules in
+# <data-dir>/productivity_timer_achievements.json, if there is one.
+# Usage: python focus_service.py serve [--port 8765] [--data-dir focus_users]
+#        python focus_service.py loadgen [--timers 10000] [--seconds 90]
+#
+#   GET  /users/<name>            status
+#   POST /users/<name>/start      start (or resume) the timer
+#   POST /users/<name>/pause
+#   POST /users/<name>/reset      log the running session as aborted, back to focus
+#   POST /users/<name>/settings   {"focus_min": 25, "break_min": 5}
+#   GET  /stats                   users, running timers, scheduler lateness
+import argparse, asyncio, collections, heapq, itertools, json, os, random, re, shutil, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+from focus_engine import TimerEngine, SessionStats
+from focus_storage import JsonStorage, load_achievements, ACHIEVEMENTS_FILE, APP_STATE_FILE, APP_JOURNAL_FILE, APP_HISTORY_FILE
+
+DEFAULT_PORT = 8765
+DEFAULT_DATA_DIR = "focus_users"
+USER_NAME = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+FOCUS_RANGE = (1, 120) # minutes
+BREAK_RANGE = (0, 60)
+# changed users are written out this often, off the event loop
+FLUSH_INTERVAL = 2.0
+MAX_BODY_BYTES = 64 * 1024
+# users are loaded (their history read) on these threads, off the event loop
+LOADER_THREADS = 4
+LATENCY_SAMPLES = 100000
+
+class LatencyStats:
+    # the last LATENCY_SAMPLES delays in seconds, summarized on demand
+    def __init__(self):
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.count = 0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        if seconds > self.worst:
+            self.worst = seconds
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+        return {"count": self.count, "p50_ms": round(pick(0.50), 3), "p99_ms": round(pick(0.99), 3),
+                "max_ms": round(self.worst * 1000, 3)}
+
+class UserTimer:
+    # One user's engine plus what is needed to save it
+    def __init__(self, name, storage, state, clock, achievements=None):
+        self.name = name
+        self.storage = storage
+        self.state = state
+        log = state.pop("session_log")
+        stats = SessionStats(state.get("stats"))
+        stats.sync(log)
+        self.engine = TimerEngine(state.get("focus_min", 25), state.get("break_min", 5),
+                                  xp=state.get("xp", 0), level=state.get("level", 1),
+                                  streak=state.get("streak", 0), badges=state.get("badges", []),
+                                  achievements=achievements, achievement_state=state.get("achievements"),
+                                  session_log=log, clock=clock, stats=stats)
+        self.engine.reevaluate_achievements() # new rules, or saved before there were any
+        self.wake = 0 # bumped whenever the scheduled deadline stops being valid
+        self.queued = False # has a valid entry in the scheduler heap
+
+    def status(self):
+        e = self.engine
+        remaining = e.clock.remaining() if e.is_running else e.remaining
+        return {"user": self.name, "running": e.is_running, "session": "focus" if e.is_focus else "break",
+                "remaining": remaining, "focus_min": e.focus_min, "break_min": e.break_min,
+                "xp": e.xp, "level": e.level, "streak": e.streak, "badges": sorted(e.badges),
+                "sessions": len(e.session_log)}
+
+    def snapshot(self):
+        # (storage, state, new journal entries, seq of the first one) for the writer thread
+        e = self.engine
+        self.state.update(focus_min=e.focus_min, break_min=e.break_min, xp=e.xp, level=e.level,
+                          streak=e.streak, badges=list(e.badges), achievements=e.tracker.to_dict(),
+                          stats=e.stats.to_dict())
+        saved = self.storage.saved
+        return self.storage, dict(self.state), [dict(r) for r in e.session_log[saved:]], saved
+
+class TimerScheduler:
+    # Every running timer has one (deadline, order, wake, timer) entry in a heap, and a
+    # single loop.call_at() handle is aimed at the earliest deadline. Timers are only
+    # woken when their session ends: status requests work the time left out from the
+    # deadline, so there is no per-second tick per timer. Pausing doesn't dig the old
+    # entry out of the heap, it bumps timer.wake and the entry is skipped when it comes up.
+    def __init__(self, loop, on_due):
+        self.loop = loop
+        self.on_due = on_due
+        self.heap = []
+        self.order = itertools.count()
+        self.handle = None
+        self.armed_at = None
+        self.stale = 0
+        self.lateness = LatencyStats()
+
+    def schedule(self, timer):
+        self.cancel(timer)
+        deadline = timer.engine.clock.deadline
+        if deadline is None:
+            return
+        heapq.heappush(self.heap, (deadline, next(self.order), timer.wake, timer))
+        timer.queued = True
+        self._arm()
+
+    def cancel(self, timer):
+        if not timer.queued:
+            return
+        timer.queued = False
+        timer.wake += 1
+        self.stale += 1
+        if self.stale > 1024 and self.stale > len(self.heap) // 2:
+            self.heap = [item for item in self.heap if item[2] == item[3].wake]
+            heapq.heapify(self.heap)
+            self.stale = 0
+
+    def _arm(self):
+        if not self.heap:
+            return
+        when = self.heap[0][0]
+        if self.handle is not None:
+            if self.armed_at <= when:
+                return
+            self.handle.cancel()
+        self.armed_at = when
+        self.handle = self.loop.call_at(when, self._run)
+
+    def _run(self):
+        self.handle = None
+        heap = self.heap
+        while heap and heap[0][0] <= self.loop.time():
+            deadline, _, wake, timer = heapq.heappop(heap)
+            if wake != timer.wake:
+                self.stale = max(0, self.stale - 1)
+                continue
+            timer.queued = False
+            self.lateness.add(max(0.0, self.loop.time() - deadline))
+            self.on_due(timer)
+        self._arm()
+
+class TimerService:
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, loop=None):
+        self.data_dir = data_dir
+        self.loop = loop or asyncio.get_running_loop()
+        self.users = {}
+        self.loading = {} # name -> task of a user being loaded, shared by concurrent requests
+        self.dirty = set()
+        self.achievements = load_achievements(os.path.join(data_dir, ACHIEVEMENTS_FILE))
+        self.scheduler = TimerScheduler(self.loop, self.on_due)
+        self.io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="focus-save")
+        self.loader = ThreadPoolExecutor(max_workers=LOADER_THREADS, thread_name_prefix="focus-load")
+        self.requests = LatencyStats()
+        self.clients = set()
+
+    # Users
+    async def user(self, name):
+        timer = self.users.get(name)
+        if timer is not None:
+            return timer
+        task = self.loading.get(name)
+        if task is None:
+            task = self.loading[name] = asyncio.ensure_future(self._load_user(name))
+        return await task
+
+    async def _load_user(self, name):
+        try:
+            timer = await self.loop.run_in_executor(self.loader, load_user, name, os.path.join(self.data_dir, name),
+                                                    self.loop.time, self.achievements)
+        finally:
+            del self.loading[name]
+        timer.engine.add_listener(lambda event, **data: self.on_engine_event(timer, event))
+        self.users[name] = timer
+        return timer
+
+    def on_engine_event(self, timer, event):
+        if event in ("session_complete", "session_aborted", "level_up", "badge"):
+            self.dirty.add(timer)
+
+    def on_due(self, timer):
+        self.dirty.add(timer)
+        if timer.engine.tick() is not None:
+            self.scheduler.schedule(timer)
+
+    # Commands
+    def start(self, timer):
+        if timer.engine.start_timer() is not None:
+            self.scheduler.schedule(timer)
+
+    def pause(self, timer):
+        if timer.engine.is_running:
+            timer.engine.pause_timer()
+            self.scheduler.cancel(timer)
+
+    def reset(self, timer):
+        timer.engine.reset_timer()
+        self.scheduler.cancel(timer)
+        self.dirty.add(timer)
+
+    def settings(self, timer, body):
+        e = timer.engine
+        focus_min = body.get("focus_min", e.focus_min)
+        break_min = body.get("break_min", e.break_min)
+        for value, (low, high) in ((focus_min, FOCUS_RANGE), (break_min, BREAK_RANGE)):
+            if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+                raise ValueError(f"durations must be whole minutes, focus {FOCUS_RANGE}, break {BREAK_RANGE}")
+        e.focus_min, e.break_min = focus_min, break_min
+        if not e.is_running: # same as changing the spinboxes in the app
+            e.is_focus = True
+            e.set_remaining(focus_min * 60)
+        self.dirty.add(timer)
+
+    def stats(self):
+        return {"users": len(self.users), "running": sum(1 for t in self.users.values() if t.engine.is_running),
+                "scheduled": len(self.scheduler.heap), "lateness": self.scheduler.lateness.summary(),
+                "requests": self.requests.summary()}
+
+    async def dispatch(self, method, path, body):
+        # -> (HTTP status, JSON payload)
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if parts == ["stats"] and method == "GET":
+            return 200, self.stats()
+        if len(parts) not in (2, 3) or parts[0] != "users":
+            return 404, {"error": "not found"}
+        if not USER_NAME.match(parts[1]):
+            return 400, {"error": "bad user name"}
+        action = parts[2] if len(parts) == 3 else None
+        if (action is None) != (method == "GET") or method not in ("GET", "POST"):
+            return 405, {"error": "method not allowed"}
+        if action not in (None, "start", "pause", "reset", "settings"):
+            return 404, {"error": "not found"}
+        timer = await self.user(parts[1])
+        if action == "settings":
+            try:
+                data = json.loads(body or b"{}")
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+                self.settings(timer, data)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+        elif action is not None:
+            getattr(self, action)(timer)
+        return 200, timer.status()
+
+    # HTTP
+    async def handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = h.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {"error": "request too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(data)}\r\n" + ("" if keep_alive else "Connection: close\r\n") + "\r\n")
+                writer.write(head.encode("latin-1") + data)
+                self.requests.add(time.perf_counter() - started)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    # Saving
+    async def flush(self):
+        jobs = [timer.snapshot() for timer in self.dirty]
+        self.dirty.clear()
+        if jobs:
+            await self.loop.run_in_executor(self.io, write_users, jobs)
+
+    async def flush_forever(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    async def close(self):
+        # like closing the app: running sessions are logged as aborted, then everything is saved
+        if self.loading:
+            await asyncio.gather(*self.loading.values(), return_exceptions=True)
+        self.loader.shutdown()
+        for timer in self.users.values():
+            if timer.engine.abort_session() is not None:
+                self.dirty.add(timer)
+        await self.flush()
+        storages = [(t.storage, t.engine.session_log) for t in self.users.values()]
+        await self.loop.run_in_executor(self.io, compact_users, storages)
+        self.io.shutdown()
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+def load_user(name, folder, clock, achievements=None):
+    # runs on a loader thread: parsing a user's history and catching their stats and
+    # achievements up with it takes time in proportion to the history
+    storage = JsonStorage(os.path.join(folder, APP_STATE_FILE), os.path.join(folder, APP_JOURNAL_FILE),
+                          os.path.join(folder, APP_HISTORY_FILE))
+    return UserTimer(name, storage, storage.load_state(), clock, achievements)
+
+def write_users(jobs):
+    # runs on the save thread
+    for storage, state, entries, first_seq in jobs:
+        os.makedirs(os.path.dirname(storage.state_file), exist_ok=True)
+        storage.save_state(state)
+        if entries and storage.append_journal(entries, first_seq):
+            storage.saved = first_seq + len(entries)
+
+def compact_users(storages):
+    for storage, log in storages:
+        if os.path.isdir(os.path.dirname(storage.state_file)):
+            storage.compact(log, force=False)
+
+async def serve(port=DEFAULT_PORT, data_dir=DEFAULT_DATA_DIR, ready=None, stop=None):
+    service = TimerService(data_dir, asyncio.get_running_loop())
+    server = await asyncio.start_server(service.handle_client, "127.0.0.1", port, backlog=1024)
+    flusher = asyncio.ensure_future(service.flush_forever())
+    if ready is not None:
+        ready.set_result((service, server.sockets[0].getsockname()[1]))
+    try:
+        await (stop if stop is not None else asyncio.Event().wait())
+    finally:
+        server.close()
+        for writer in list(service.clients):
+            writer.close() # open keep-alive connections end their handler cleanly
+        await asyncio.sleep(0)
+        flusher.cancel()
+        await service.close()
+    return service
+
+# Load generator
+async def http_request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        if h.lower().startswith(b"content-length:"):
+            length = int(h.split(b":")[1])
+    return status, json.loads(await reader.readexactly(length))
+
+async def loadgen(timers=10000, seconds=90, ramp=20, rate=2000, connections=32, focus_min=1, break_min=1):
+    # Starts `timers` users with 1-minute sessions spread over `ramp` seconds (so
+    # sessions end at a steady pace, not all at once), then keeps sending status
+    # requests (and now and then a pause/resume) at `rate` per second until `seconds`
+    # have passed. Everything runs against a throwaway data folder.
+    data_dir = tempfile.mkdtemp(prefix="focus-loadgen-")
+    loop = asyncio.get_running_loop()
+    ready, stop = loop.create_future(), loop.create_future()
+    server = asyncio.ensure_future(serve(0, data_dir, ready, stop))
+    service, port = await ready
+    client_latency = LatencyStats()
+    errors = collections.Counter()
+    t0 = loop.time()
+    end = t0 + seconds
+
+    async def worker(w):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        async def call(method, path, body=None):
+            started = loop.time()
+            status, _ = await http_request(reader, writer, method, path, body)
+            client_latency.add(loop.time() - started)
+            if status != 200:
+                errors[status] += 1
+
+        for i in range(w, timers, connections):
+            await asyncio.sleep(max(0.0, t0 + i * ramp / timers - loop.time()))
+            await call("POST", f"/users/u{i}/settings", {"focus_min": focus_min, "break_min": break_min})
+            await call("POST", f"/users/u{i}/start")
+        interval = connections / rate
+        next_at = loop.time()
+        while loop.time() < end:
+            user = f"u{random.randrange(timers)}"
+            if random.random() < 0.05:
+                await call("POST", f"/users/{user}/pause")
+                await call("POST", f"/users/{user}/start")
+            else:
+                await call("GET", f"/users/{user}")
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+        writer.close()
+
+    try:
+        await asyncio.gather(*(worker(w) for w in range(connections)))
+        result = service.stats()
+        result.update(timers=timers, seconds=seconds, completed=sum(t.engine.stats.completed for t in service.users.values()),
+                      client=client_latency.summary(), errors=dict(errors))
+    finally:
+        stop.set_result(None)
+        await server
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Focus+ multi-user timer service")
+    parser.add_argument("mode", nargs="?", default="serve", choices=["serve", "loadgen"])
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--timers", type=int, default=10000)
+    parser.add_argument("--seconds", type=float, default=90)
+    parser.add_argument("--ramp", type=float, default=20)
+    parser.add_argument("--rate", type=float, default=2000, help="requests per second once all timers run")
+    args = parser.parse_args()
+    if args.mode == "serve":
+        print(f"Focus+ service on http://127.0.0.1:{args.port}/ (data in {os.path.abspath(args.data_dir)})")
+        try:
+            asyncio.run(serve(args.port, args.data_dir))
+        except KeyboardInterrupt:
+            pass
+    else:
+        r = asyncio.run(loadgen(args.timers, args.seconds, args.ramp, args.rate))
+        late, req, client = r["lateness"], r["requests"], r["client"]
+        print(f"{r['timers']} timers, {r['running']} running at the end, {r['completed']} sessions completed in {r['seconds']:.0f} s")
+        print(f"session end lateness  p50 {late['p50_ms']:.2f} ms  p99 {late['p99_ms']:.2f} ms  max {late['max_ms']:.2f} ms")
+        print(f"requests {client['count']}  server p50 {req['p50_ms']:.3f} ms  p99 {req['p99_ms']:.3f} ms  "
+              f"round trip p50 {client['p50_ms']:.2f} ms  p99 {client['p99_ms']:.2f} ms  errors {r['errors'] or 0}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,588 @@
+# Focus+ timer persistence. Two interchangeable backends:
+#   JsonStorage    productivity_timer_state.json + an append-only session journal
+#   SqliteStorage  productivity_timer.db (WAL, indexed sessions table)
+# Both offer load_settings() / load_history() / load_state() / save_state() /
+# save_sessions() / replace_sessions() / compact() / clear() / close().
+# ExportJob writes the history out as CSV.
+import itertools, json, os, sys, threading, time # sqlite3 is only imported when SQLite is used
+
+from focus_engine import Achievements, SessionStore, SESSION_KEYS, SESSION_TYPES, format_time, parse_time
+from focus_history import day_bounds
+
+APP_STATE_FILE = "productivity_timer_state.json"
+# Session history is kept out of the state file: every finished/aborted session is
+# appended to the journal (one JSON object per line) and folded into the history
+# snapshot now and then, so ending a session never rewrites the whole history.
+APP_JOURNAL_FILE = "productivity_timer_journal.jsonl"
+APP_HISTORY_FILE = "productivity_timer_history.json"
+JOURNAL_COMPACT_BYTES = 256 * 1024
+APP_DB_FILE = "productivity_timer.db"
+# settings changes are written after this many seconds without a new change
+STATE_WRITE_DELAY = 0.5
+SQLITE_BATCH_ROWS = 10000
+# optional achievement rules and level curve (see focus_engine.Achievements)
+ACHIEVEMENTS_FILE = "productivity_timer_achievements.json"
+
+def _read_json(path, default):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return default
+    return default
+
+def _write_json_atomic(path, data, indent=None):
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        return False
+
+def _entry_lines(session_log):
+    # one JSON object per session, as json.dumps(dict(entry)) would write it but
+    # straight from a SessionStore's arrays
+    if not isinstance(session_log, SessionStore):
+        for entry in session_log:
+            yield json.dumps(dict(entry), ensure_ascii=False)
+        return
+    types = [json.dumps(t, ensure_ascii=False) for t in SESSION_TYPES]
+    odd = session_log.odd_times
+    for i, (t, code, minutes, xp) in enumerate(zip(session_log.times, session_log.codes, session_log.minutes, session_log.xp)):
+        when = json.dumps(odd[i], ensure_ascii=False) if i in odd else f'"{format_time(t)}"'
+        yield f'{{"time": {when}, "type": {types[code >> 1]}, "minutes": {minutes}, "xp": {xp}, "success": {"true" if code & 1 else "false"}}}'
+
+class JsonStorage:
+    def __init__(self, state_file=APP_STATE_FILE, journal_file=APP_JOURNAL_FILE, history_file=APP_HISTORY_FILE):
+        self.state_file = state_file
+        self.journal_file = journal_file
+        self.history_file = history_file
+        self.saved = 0 # sessions already on disk
+        self.legacy_log = None # old-format log still waiting to be moved into the snapshot
+
+    def exists(self):
+        return any(os.path.exists(p) for p in (self.state_file, self.journal_file, self.history_file))
+
+    def read_snapshot(self):
+        # the snapshot is a JSON array with one session per line, read line by line so
+        # a background load never holds the GIL for the whole parse
+        log = SessionStore()
+        try:
+            with open(self.history_file, "r", encoding="utf-8") as f:
+                if f.readline().strip() != "[":
+                    f.seek(0)
+                    snapshot = json.load(f)
+                    return SessionStore(snapshot if isinstance(snapshot, list) else [])
+                for line in f:
+                    line = line.rstrip().rstrip(",")
+                    if line and line != "]":
+                        log.append(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        return log
+
+    def load_history(self):
+        # snapshot first, then replay the journal on top of it
+        log = self.read_snapshot()
+        if self.legacy_log is not None: # the snapshot couldn't be written yet
+            log = SessionStore(list(self.legacy_log) + list(log))
+        if os.path.exists(self.journal_file):
+            try:
+                with open(self.journal_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break # torn last line after a crash
+                        # "seq" is the entry's index in the full log; lines already folded
+                        # into the snapshot (compaction interrupted before truncating) are skipped
+                        if entry.pop("seq", len(log)) >= len(log):
+                            log.append(entry)
+            except Exception:
+                pass
+        self.saved = len(log)
+        return log
+
+    def load_settings(self):
+        state = _read_json(self.state_file, {})
+        if not isinstance(state, dict):
+            state = {}
+        legacy_log = state.pop("session_log", None)
+        if legacy_log and not os.path.exists(self.history_file):
+            # old format kept the log inside the state file: move it to the snapshot once.
+            # Until that works it stays in the state file (see save_state()) and is
+            # part of the loaded history
+            if self.compact(SessionStore(list(legacy_log) + list(self.load_history()))):
+                self.save_state(state)
+            else:
+                self.legacy_log = legacy_log
+        return state
+
+    def load_state(self):
+        state = self.load_settings()
+        state["session_log"] = self.load_history()
+        return state
+
+    def save_state(self, state):
+        # the session log never goes in here, see save_sessions()
+        data = {k: v for k, v in state.items() if k != "session_log"}
+        if self.legacy_log is not None:
+            data["session_log"] = self.legacy_log
+        return _write_json_atomic(self.state_file, data, indent=2)
+
+    def append_journal(self, entries, first_seq):
+        try:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                for i, entry in enumerate(entries):
+                    f.write(json.dumps(dict(entry, seq=first_seq + i), ensure_ascii=False) + "\n")
+            return True
+        except Exception:
+            return False
+
+    def save_sessions(self, session_log):
+        # only the sessions added since the last save are appended to the journal
+        if len(session_log) > self.saved:
+            if self.append_journal(session_log[self.saved:], self.saved):
+                self.saved = len(session_log)
+
+    def replace_sessions(self, session_log):
+        # the whole history changed (import): new snapshot, empty journal
+        return self.compact(session_log, force=True)
+
+    def journal_size(self):
+        try:
+            return os.path.getsize(self.journal_file)
+        except OSError:
+            return 0
+
+    def compact(self, session_log, force=True):
+        # write the full log as the new snapshot, then start an empty journal
+        if not force and self.journal_size() <= JOURNAL_COMPACT_BYTES:
+            return False
+        tmp = self.history_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("[\n")
+                for i, line in enumerate(_entry_lines(session_log)):
+                    f.write((",\n" if i else "") + line)
+                f.write("\n]\n")
+            os.replace(tmp, self.history_file)
+        except Exception:
+            return False
+        self.legacy_log = None # the log written included it
+        try:
+            open(self.journal_file, "w").close()
+        except Exception:
+            pass
+        self.saved = len(session_log)
+        return True
+
+    def clear(self):
+        for path in (self.state_file, self.journal_file, self.history_file):
+            try:
+                if os.path.exists(path):
+                    os.unlink(path)
+            except Exception:
+                pass
+        self.saved = 0
+        self.legacy_log = None
+
+    def close(self):
+        pass
+
+class SqliteSessionLog:
+    # The session log as seen by the app when using SqliteStorage. Nothing is read
+    # at startup: appends are buffered until the next save_sessions(), and iteration
+    # streams rows from the database (on its own connection, so it is safe from an
+    # export thread).
+    def __init__(self, storage):
+        self.storage = storage
+        self.stored = storage.session_count()
+        self.pending = []
+
+    def __len__(self):
+        return self.stored + len(self.pending)
+
+    def append(self, entry):
+        self.pending.append({k: entry.get(k) for k in SESSION_KEYS})
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            rows = list(self.storage.iter_sessions(start, min(stop, self.stored))) if start < self.stored else []
+            return rows + self.pending[max(start - self.stored, 0):max(stop - self.stored, 0)]
+        if i < 0:
+            i += len(self)
+        if i >= self.stored:
+            return self.pending[i - self.stored]
+        row = self.storage.fetch_session(i)
+        if row is None:
+            raise IndexError("session index out of range")
+        return row
+
+    def __iter__(self):
+        stored, pending = self.stored, list(self.pending)
+        yield from self.storage.iter_sessions(stop=stored)
+        yield from pending
+
+    def session_store(self):
+        # the log packed into a SessionStore; sessions appended after this are not in it
+        store = self.storage.session_store(self.stored)
+        store.extend(list(self.pending))
+        return store
+
+    def flush(self):
+        if self.pending:
+            self.storage.insert_sessions(self.pending, self.stored)
+            self.stored += len(self.pending)
+            self.pending = []
+
+class SqliteStorage:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sessions (
+            seq INTEGER PRIMARY KEY, time TEXT NOT NULL, type TEXT NOT NULL,
+            minutes INTEGER NOT NULL, xp INTEGER NOT NULL, success INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS sessions_time ON sessions (time);
+        CREATE INDEX IF NOT EXISTS sessions_type_time ON sessions (type, time);
+    """
+
+    def __init__(self, path=APP_DB_FILE, migrate_from=None):
+        self.path = path
+        self._lock = threading.Lock() # the state writer thread shares the connection
+        self.db = self._connect()
+        self.db.executescript(self.SCHEMA)
+        if migrate_from is None:
+            migrate_from = JsonStorage()
+        if migrate_from and self._get("migrated") is None:
+            self.migrate(migrate_from)
+
+    def _connect(self):
+        import sqlite3
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _get(self, key):
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def migrate(self, source):
+        # first run with SQLite: pull in the JSON state and history once; the JSON
+        # files are left where they are
+        with self._lock, self.db:
+            if source.exists() and self.db.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None:
+                state = source.load_state()
+                log = state.pop("session_log")
+                self._write_state(state)
+                self._insert(log, 0)
+            self.db.execute("INSERT OR REPLACE INTO state VALUES ('migrated', ?)", (json.dumps(time.strftime("%Y-%m-%d %H:%M:%S")),))
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def session_count(self):
+        with self._lock:
+            row = self.db.execute("SELECT max(seq) FROM sessions").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def load_settings(self):
+        with self._lock:
+            rows = self.db.execute("SELECT key, value FROM state WHERE key != 'migrated'").fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def load_history(self):
+        return SqliteSessionLog(self)
+
+    def load_state(self):
+        state = self.load_settings()
+        state["session_log"] = self.load_history()
+        return state
+
+    def _write_state(self, state):
+        self.db.executemany("INSERT OR REPLACE INTO state VALUES (?, ?)",
+                            [(k, json.dumps(v, ensure_ascii=False)) for k, v in state.items() if k != "session_log"])
+
+    def save_state(self, state):
+        import sqlite3
+        try:
+            with self._lock, self.db:
+                self._write_state(state)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _insert(self, entries, first_seq):
+        # batched, parameterized inserts; seq makes a repeated save harmless
+        batch = []
+        for i, e in enumerate(entries):
+            batch.append((first_seq + i, e.get("time", ""), e.get("type", ""), int(e.get("minutes", 0) or 0),
+                          int(e.get("xp", 0) or 0), 1 if e.get("success", False) else 0))
+            if len(batch) >= SQLITE_BATCH_ROWS:
+                self.db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            self.db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+    def insert_sessions(self, entries, first_seq):
+        with self._lock, self.db:
+            self._insert(entries, first_seq)
+
+    def save_sessions(self, session_log):
+        session_log.flush()
+
+    def replace_sessions(self, session_log):
+        import sqlite3
+        try:
+            with self._lock, self.db:
+                self.db.execute("DELETE FROM sessions")
+                self._insert(session_log, 0)
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _row(r):
+        return {"time": r[0], "type": r[1], "minutes": r[2], "xp": r[3], "success": bool(r[4])}
+
+    def fetch_session(self, seq):
+        with self._lock:
+            r = self.db.execute("SELECT time, type, minutes, xp, success FROM sessions WHERE seq = ?", (seq,)).fetchone()
+        return None if r is None else self._row(r)
+
+    def iter_sessions(self, start=0, stop=None):
+        import sqlite3
+        db = sqlite3.connect(self.path)
+        try:
+            cur = db.execute("SELECT time, type, minutes, xp, success FROM sessions WHERE seq >= ? AND seq < ? ORDER BY seq",
+                             (start, stop if stop is not None else 2**62))
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                for r in rows:
+                    yield self._row(r)
+        finally:
+            db.close()
+
+    def session_store(self, stop=None):
+        # sessions [0, stop) packed into a SessionStore, on their own connection; SQLite
+        # turns the times into seconds (read as UTC, like parse_time())
+        import sqlite3
+        store = SessionStore()
+        codes = {typ: i for i, typ in enumerate(SESSION_TYPES)}
+        db = sqlite3.connect(self.path)
+        try:
+            cur = db.execute("SELECT CAST(strftime('%s', time) AS INTEGER), length(time), type, minutes, xp, success, time"
+                             " FROM sessions WHERE seq < ? ORDER BY seq", (stop if stop is not None else 2**62,))
+            append = store.append_fields
+            while True:
+                rows = cur.fetchmany(10000)
+                if not rows:
+                    break
+                for secs, length, typ, minutes, xp, success, text in rows:
+                    code = codes.get(typ)
+                    if secs is None or length != 19 or code is None:
+                        store.append(self._row((text, typ, minutes, xp, success)))
+                        codes = {typ: i for i, typ in enumerate(SESSION_TYPES)} # it may have added a type
+                    else:
+                        append(secs, code, minutes, xp, success)
+        finally:
+            db.close()
+        return store
+
+    def focus_minutes_per_day(self, start_date, end_date):
+        # [(YYYY-MM-DD, minutes)] for successful focus sessions, dates inclusive
+        with self._lock:
+            return self.db.execute(
+                "SELECT substr(time, 1, 10) AS day, sum(minutes) FROM sessions"
+                " WHERE type = 'focus' AND success = 1 AND time >= ? AND time < ?"
+                " GROUP BY day ORDER BY day", (start_date, end_date + "~")).fetchall()
+
+    def compact(self, session_log, force=True):
+        with self._lock:
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def clear(self):
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM sessions")
+            # keep the migrated marker so cleared data doesn't come back from the JSON files
+            self.db.execute("DELETE FROM state WHERE key != 'migrated'")
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+def open_storage(kind=None):
+    # "json" or "sqlite"; default from $FOCUS_TIMER_STORAGE, else SQLite if its
+    # database is already there, else JSON
+    kind = kind or os.environ.get("FOCUS_TIMER_STORAGE") or ("sqlite" if os.path.exists(APP_DB_FILE) else "json")
+    if kind == "sqlite":
+        return SqliteStorage()
+    return JsonStorage()
+
+def load_achievements(path=ACHIEVEMENTS_FILE):
+    # the rules in `path`, or the built-in ones when it is missing or broken
+    if not os.path.exists(path):
+        return Achievements()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return Achievements(json.load(f))
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        print(f"Warning: Could not load {path}, using the built-in achievements. Error: {e}", file=sys.stderr)
+        return Achievements()
+
+class StateWriter:
+    # Writes the state file on a background thread. Bursts of submit() calls
+    # (e.g. dragging the font slider) collapse into one write of the latest state
+    # once things have been quiet for `delay` seconds.
+    def __init__(self, write, delay=STATE_WRITE_DELAY):
+        self.write = write
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = None
+        self._due = 0.0
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, state):
+        with self._cond:
+            self._pending = dict(state) # snapshot taken on the caller's thread
+            self._due = time.monotonic() + self.delay
+            self._cond.notify_all()
+
+    def flush(self):
+        # write whatever is pending right now and wait for it
+        with self._cond:
+            self._due = 0.0
+            self._cond.notify_all()
+            while (self._pending is not None or self._busy) and self._thread.is_alive():
+                self._cond.wait(0.5)
+
+    def discard(self):
+        # drop a pending write (used before deleting the saved data)
+        with self._cond:
+            self._pending = None
+            while self._busy:
+                self._cond.wait()
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._pending is not None:
+                        left = self._due - time.monotonic()
+                        if left <= 0:
+                            break
+                        self._cond.wait(left)
+                    else:
+                        self._cond.wait()
+                if self._pending is None:
+                    return # closed and nothing left to write
+                state, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self.write(state)
+            except Exception as e: # keep the thread alive, or flush() would wait forever
+                print(f"Warning: Could not save the settings. Error: {e}", file=sys.stderr)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+# CSV export
+EXPORT_COLUMNS = ["time", "type", "minutes", "xp", "success"]
+EXPORT_CHUNK_ROWS = 5000
+
+class ExportJob:
+    # Streams the session log to a CSV file (gzip if the name ends in .gz) on a
+    # worker thread, a chunk of rows at a time. The caller (Tk or the CLI) polls
+    # done/total/finished instead of being called back from the thread. Dates are
+    # "YYYY-MM-DD", inclusive (ValueError otherwise); types None exports every type.
+    def __init__(self, session_log, path, start_date=None, end_date=None, types=None, compress=None):
+        self.rows = session_log
+        self.total = len(session_log) # entries appended after this are not exported
+        self.path = path
+        self.lo, self.hi = day_bounds(start_date, end_date) # parsed times, as focus_engine.parse_time
+        self.types = None if types is None else set(types)
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.done = 0 # entries looked at
+        self.written = 0 # rows written
+        self.finished = False
+        self.error = None
+        self._cancel = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="csv-export", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wanted(self, r):
+        if self.lo is not None or self.hi is not None:
+            t = parse_time(r.get("time"))
+            if t is None or self.lo is not None and t < self.lo or self.hi is not None and t >= self.hi:
+                return False
+        return self.types is None or r.get("type") in self.types
+
+    def _run(self):
+        import csv, gzip, io
+        tmp = self.path + ".part"
+        try:
+            opener = gzip.open if self.compress else open
+            with opener(tmp, "wt", newline='', encoding="utf-8") as f:
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(EXPORT_COLUMNS)
+                for i, r in enumerate(itertools.islice(self.rows, self.total)):
+                    if self.wanted(r):
+                        writer.writerow([r.get("time",""), r.get("type",""), r.get("minutes",""), r.get("xp",""), r.get("success", False)])
+                        self.written += 1
+                    if (i + 1) % EXPORT_CHUNK_ROWS == 0:
+                        f.write(buf.getvalue())
+                        buf.seek(0); buf.truncate()
+                        self.done = i + 1
+                        if self._cancel.is_set():
+                            break
+                f.write(buf.getvalue())
+            if self._cancel.is_set():
+                os.unlink(tmp)
+            else:
+                os.replace(tmp, self.path)
+                self.done = self.total
+        except Exception as e:
+            self.error = e
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        finally:
+            self.finished = True
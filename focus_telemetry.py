@@ -0,0 +1,144 @@
+# Performance telemetry: counters and fixed-bucket latency histograms. Nothing is
+# measured unless Telemetry(enabled=True): instrumenting works by wrapping methods
+# on the instances, so a disabled Telemetry leaves the measured code untouched.
+import bisect, json, os, time
+
+# bucket upper bounds in milliseconds; one more bucket catches everything above
+BUCKET_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th value (the max for the last bucket)
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in BUCKET_BOUNDS_MS] + [f">{BUCKET_BOUNDS_MS[-1]}"]
+        return {"count": self.count, "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+                "p50_ms": self.percentile(0.5), "p99_ms": self.percentile(0.99), "max_ms": round(self.max, 4),
+                "buckets": {label: n for label, n in zip(labels, self.counts) if n}}
+
+class Telemetry:
+    def __init__(self, enabled=False, path=None):
+        self.enabled = enabled
+        self.path = path # where dump() writes by default
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self._tick_due = None
+        self._last_late = None
+
+    def histogram(self, name):
+        h = self.histograms.get(name)
+        if h is None:
+            h = self.histograms[name] = Histogram()
+        return h
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def time_calls(self, obj, *methods):
+        # histogram "<method>" of how long each call to obj.<method> takes
+        if not self.enabled:
+            return
+        for name in methods:
+            original = getattr(obj, name)
+            hist = self.histogram(name)
+            def timed(*args, _original=original, _hist=hist, **kw):
+                t0 = time.perf_counter()
+                try:
+                    return _original(*args, **kw)
+                finally:
+                    _hist.add((time.perf_counter() - t0) * 1000)
+            setattr(obj, name, timed)
+
+    def time_ticks(self, obj, schedule="schedule_tick", tick="countdown_tick"):
+        # tick_latency: how late obj.<tick> runs compared to the delay passed to
+        # obj.<schedule>(ms); tick_jitter: change in that lateness from one tick to the next
+        if not self.enabled:
+            return
+        original_schedule, original_tick = getattr(obj, schedule), getattr(obj, tick)
+        latency, jitter = self.histogram("tick_latency"), self.histogram("tick_jitter")
+
+        def scheduled(ms, *args, **kw):
+            self._tick_due = time.perf_counter() + ms / 1000
+            return original_schedule(ms, *args, **kw)
+
+        def ticked(*args, **kw):
+            if self._tick_due is not None:
+                late = max(0.0, (time.perf_counter() - self._tick_due) * 1000)
+                self._tick_due = None
+                latency.add(late)
+                if self._last_late is not None:
+                    jitter.add(abs(late - self._last_late))
+                self._last_late = late
+            return original_tick(*args, **kw)
+
+        setattr(obj, schedule, scheduled)
+        setattr(obj, tick, ticked)
+        self.time_calls(obj, tick)
+
+    def time_saves(self, storage, method="save_state"):
+        # save_state duration plus the bytes written (size of the state file, or of
+        # the JSON for storages without one)
+        if not self.enabled:
+            return
+        original = getattr(storage, method)
+        hist = self.histogram(method)
+        for suffix in ("_calls", "_bytes", "_failures"): # created here, not on the writer thread
+            self.counters[method + suffix] = 0
+
+        def saved(state, *args, **kw):
+            t0 = time.perf_counter()
+            ok = original(state, *args, **kw)
+            hist.add((time.perf_counter() - t0) * 1000)
+            try:
+                size = os.path.getsize(storage.state_file)
+            except (AttributeError, OSError):
+                size = len(json.dumps(state, ensure_ascii=False).encode("utf-8"))
+            self.count(method + "_calls")
+            self.count(method + "_bytes", size)
+            if not ok:
+                self.count(method + "_failures")
+            return ok
+        setattr(storage, method, saved)
+
+    def snapshot(self):
+        return {"started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "seconds": round(time.time() - self.started, 1), "counters": dict(self.counters),
+                "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())}}
+
+    def dump(self, path=None):
+        path = path or self.path
+        if not self.enabled or not path:
+            return False
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp, path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,29 @@
+import unittest
+
+from focus_engine import make_simulation
+
+class SuspendTest(unittest.TestCase):
+    def test_wall_clock_jump_keeps_the_session(self):
+        # an NTP step or a manual clock change, with the machine awake
+        engine, vclock = make_simulation(focus_min=25)
+        engine.start_timer()
+        vclock.advance(60)
+        engine.tick()
+        vclock.wall_offset += 3600
+        vclock.advance(1)
+        engine.tick()
+        self.assertEqual(engine.remaining, 25 * 60 - 61)
+        self.assertEqual(len(engine.session_log), 0)
+
+    def test_time_asleep_counts_as_elapsed(self):
+        engine, vclock = make_simulation(focus_min=25)
+        engine.start_timer()
+        vclock.advance(60)
+        engine.tick()
+        vclock.suspend(10 * 60)
+        vclock.advance(1)
+        engine.tick()
+        self.assertEqual(engine.remaining, 25 * 60 - 61 - 10 * 60)
+
+if __name__ == "__main__":
+    unittest.main()
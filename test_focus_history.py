@@ -0,0 +1,44 @@
+import random, sys, unittest
+from unittest import mock
+
+from focus_engine import SessionStore
+from focus_history import HistoryIndex
+
+def sessions(times):
+    return [{"time": t, "type": "focus" if i % 2 == 0 else "break", "minutes": 25 - i % 20,
+             "xp": i % 7, "success": i % 3 != 0} for i, t in enumerate(times)]
+
+class PurePythonHistoryIndexTest(unittest.TestCase):
+    # HistoryIndex without numpy, on logs that are not in time order
+    def index(self, store):
+        with mock.patch.dict(sys.modules, {"numpy": None}):
+            index = HistoryIndex(store)
+        self.assertIsNone(index.np)
+        return index
+
+    def test_time_sort_on_shuffled_log(self):
+        times = [f"2024-01-{day:02d} 10:00:00" for day in range(1, 29)]
+        random.Random(1).shuffle(times)
+        index = self.index(SessionStore(sessions(times)))
+        self.assertFalse(index.time_sorted)
+        shown = [index.row(i)[0] for i in index.query(sort="time", descending=True)]
+        self.assertEqual(shown, sorted(times, reverse=True))
+
+    def test_time_sort_with_unparseable_time(self):
+        times = ["2024-01-01 10:00:00", "oops", "2024-01-02 10:00:00"]
+        index = self.index(SessionStore(sessions(times)))
+        self.assertEqual([index.row(i)[0] for i in index.query(sort="time")], ["oops"] + times[::2])
+
+    def test_filtered_sorts_match_a_plain_sort(self):
+        times = [f"2024-02-{day:02d} {hour:02d}:00:00" for day in range(1, 15) for hour in (9, 14)]
+        random.Random(2).shuffle(times)
+        store = SessionStore(sessions(times))
+        index = self.index(store)
+        rows = [index.row(i) for i in range(len(store))]
+        for column, key in (("time", 0), ("minutes", 2), ("xp", 3)):
+            got = [index.row(i) for i in index.query(sort=column, types=["focus"], start_date="2024-02-03", end_date="2024-02-10")]
+            want = sorted((r for r in rows if r[1] == "focus" and "2024-02-03" <= r[0][:10] <= "2024-02-10"), key=lambda r: r[key])
+            self.assertEqual([r[key] for r in got], [r[key] for r in want])
+
+if __name__ == "__main__":
+    unittest.main()
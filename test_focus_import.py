@@ -0,0 +1,45 @@
+import json, os, shutil, tempfile, unittest
+
+from focus_engine import SessionStore
+from focus_import import ImportJob, parse_to_run
+from focus_storage import JsonStorage
+
+GOOD = {"time": "2024-01-03 10:00:00", "type": "focus", "minutes": 25, "xp": 25, "success": True}
+
+class NonObjectSessionsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_json_list_of_non_objects_is_skipped(self):
+        path = self.write("bad.json", "[1, 2, 3]")
+        run, count, skipped, _, error = parse_to_run(path, path + ".run")
+        self.assertIsNone(error)
+        self.assertEqual((count, skipped), (0, 3))
+
+    def test_jsonl_non_object_lines_are_skipped(self):
+        path = self.write("journal.jsonl", "\n".join(['"x"', "5", json.dumps(GOOD)]) + "\n")
+        run, count, skipped, _, error = parse_to_run(path, path + ".run")
+        self.assertIsNone(error)
+        self.assertEqual((count, skipped), (1, 2))
+
+    def test_bad_file_does_not_stop_the_import(self):
+        good = self.write("a.json", json.dumps([GOOD]))
+        bad = self.write("bad.json", "[1, 2, 3]")
+        storage = JsonStorage(*(os.path.join(self.dir, name) for name in ("state.json", "journal.jsonl", "history.json")))
+        job = ImportJob([good, bad], storage, SessionStore(), workers=1).start()
+        job.thread.join()
+        self.assertIsNone(job.error)
+        self.assertEqual(job.result["sessions"], 1)
+        self.assertEqual(job.result["skipped"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
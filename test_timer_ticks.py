@@ -0,0 +1,67 @@
+import itertools, unittest
+from unittest import mock
+
+from focus_engine import make_simulation
+from Final_PY_SuXieJung import ProductivityTimerApp
+
+class FakeRoot:
+    # after()/after_cancel() on a virtual clock; run() fires the jobs that are due
+    def __init__(self, vclock):
+        self.vclock = vclock
+        self.jobs = {}
+        self.ids = itertools.count()
+
+    def after(self, ms, func):
+        job = f"after#{next(self.ids)}"
+        self.jobs[job] = (self.vclock.now + ms / 1000, func)
+        return job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run(self, seconds):
+        end = self.vclock.now + seconds
+        while True:
+            due = min(self.jobs.items(), key=lambda item: item[1][0], default=None)
+            if due is None or due[1][0] > end:
+                break
+            job, (when, func) = due
+            del self.jobs[job]
+            self.vclock.now = max(self.vclock.now, when)
+            func()
+        self.vclock.now = end
+
+def make_app():
+    engine, vclock = make_simulation()
+    app = object.__new__(ProductivityTimerApp)
+    app.engine = engine
+    app.root = FakeRoot(vclock)
+    app._tick_job = None
+    app.hidden = False
+    for name in ("view", "tk_counter", "update_timer_display", "sync_durations"):
+        setattr(app, name, mock.MagicMock())
+    return app
+
+class TickSchedulingTest(unittest.TestCase):
+    def test_one_pending_tick_after_pause_start_toggles(self):
+        app = make_app()
+        app.start_timer()
+        for _ in range(4):
+            app.root.run(0.3)
+            app.pause_timer()
+            self.assertEqual(len(app.root.jobs), 0)
+            app.start_timer()
+            self.assertEqual(len(app.root.jobs), 1)
+
+    def test_one_redraw_per_second_after_toggles(self):
+        app = make_app()
+        app.start_timer()
+        for _ in range(4):
+            app.pause_timer()
+            app.start_timer()
+        app.update_timer_display.reset_mock()
+        app.root.run(10.5) # the display changes just after each whole second
+        self.assertEqual(app.update_timer_display.call_count, 10)
+
+if __name__ == "__main__":
+    unittest.main()